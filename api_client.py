@@ -0,0 +1,30 @@
+import os
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+load_dotenv()
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+# Point at any OpenAI-compatible endpoint, e.g. fake_llm_server.py for offline runs.
+BASE_URL = os.getenv('LLM_BASE_URL', DEFAULT_BASE_URL)
+API_KEY = os.getenv('OPENROUTER_API_KEY') or os.getenv('LLM_API_KEY')
+
+
+def create_client(base_url=None, api_key=None):
+    """
+    OpenAI-compatible client for the analysis scripts. The client's own retries are
+    off; RequestExecutor retries (and counts) throttling and server errors.
+    """
+    return OpenAI(
+        base_url=base_url or BASE_URL,
+        # A placeholder lets the client be built at import time; missing_api_key()
+        # is what the scripts check before calling OpenRouter.
+        api_key=api_key or API_KEY or 'not-set',
+        max_retries=0
+    )
+
+
+def missing_api_key() -> bool:
+    """True when calls would go to OpenRouter without a key."""
+    return not API_KEY and BASE_URL == DEFAULT_BASE_URL
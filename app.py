@@ -1,33 +1,56 @@
+import hashlib
 import json
 import os
 import shutil
-from datetime import datetime
+import threading
+from datetime import date, datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from flask import Flask, jsonify, render_template, request, send_from_directory, Response
+import click
+from flask import Flask, abort, jsonify, render_template, request, send_file, send_from_directory, Response
+from werkzeug.security import safe_join
+
+import thumbnails
+from event_stream import Broadcaster
+from record_store import JsonRecordStore, RecordStore, SqliteRecordStore
 
 BASE_DIR = Path(__file__).parent
 DATA_FILE = BASE_DIR / "inspection_data.json"
+SQLITE_FILE = BASE_DIR / "inspection_data.db"
 BACKUP_DIR = BASE_DIR / "backups"
+THUMB_CACHE_DIR = BASE_DIR / "thumb_cache"
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MB", "512")) * 1024 * 1024
 PRIMARY_ANALYSIS_FILE = BASE_DIR / "analysis_results.json"
 FALLBACK_ANALYSIS_FILE = BASE_DIR / "Analysis_Results" / "analysis_results.json"
 
 ALLOWED_STATUSES = {"pending", "approved", "rejected"}
 ALLOWED_UPDATE_FIELDS = {"status", "task", "description", "importance"}
+ALLOWED_FILTER_FIELDS = {"status", "folder", "severity", "has_issues", "importance"}
+# Reviewer fields that re-ingesting analysis results never overwrites. The AI description
+# is refreshed too, unless a reviewer rewrote it (flagged with EDITED_FLAG).
+REVIEW_FIELDS = {"status", "task", "importance"}
+EDITED_FLAG = "description_edited"
+
+INGEST_BATCH_SIZE = 500
+INGEST_READ_SIZE = 64 * 1024
+
+# "json" keeps the single inspection_data.json file; "sqlite" uses inspection_data.db
+# (populate it once with `python record_store.py --from-json inspection_data.json`).
+STORE_BACKEND = os.getenv("INSPECTION_STORE", "json").lower()
 
 app = Flask(__name__, template_folder=str(BASE_DIR / "templates"))
 
 
-def load_json(path: Path):
-    with path.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+def create_store() -> RecordStore:
+    if STORE_BACKEND == "sqlite":
+        return SqliteRecordStore(SQLITE_FILE)
+    return JsonRecordStore(DATA_FILE, BACKUP_DIR)
 
 
-def write_json(path: Path, payload) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2)
+STORE = create_store()
+BROADCASTER = Broadcaster()
+THUMBS = thumbnails.ThumbnailCache(THUMB_CACHE_DIR, THUMB_CACHE_MAX_BYTES)
 
 
 def map_importance(severity: str) -> str:
@@ -79,44 +102,131 @@ def transform_ai_results(raw: List[Dict]) -> List[Dict]:
     return transformed
 
 
-def bootstrap_inspection_data() -> List[Dict]:
+def iter_analysis_results(path: Path) -> Iterator[Dict]:
+    """
+    Yield raw analysis results one at a time from either a JSON array (the
+    analyzer's output) or JSON Lines, without loading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with path.open("r", encoding="utf-8") as handle:
+        buffer = handle.read(INGEST_READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            handle.seek(0)
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        buffer, pos, eof = buffer[1:], 0, False
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The next element straddles the chunk boundary; read on and retry.
+                chunk = handle.read(INGEST_READ_SIZE)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+
+
+def ingest_analysis_results(source: Path) -> Dict[str, int]:
+    """
+    Merge analysis results into the store by folder/filename id. New photos are
+    added; known ones get fresh AI fields but keep reviewer edits (REVIEW_FIELDS, and
+    descriptions a reviewer rewrote).
+    """
+    edited = {item["id"] for item in STORE.find({EDITED_FLAG: True})}
+
+    def upsert(raw: List[Dict]) -> None:
+        records = transform_ai_results(raw)
+        for record in records:
+            if record["id"] in edited:
+                del record["description"]
+        for key, count in STORE.upsert_many(records, REVIEW_FIELDS).items():
+            totals[key] += count
+
+    totals = {"added": 0, "updated": 0, "unchanged": 0}
+    batch: List[Dict] = []
+    for raw in iter_analysis_results(source):
+        batch.append(raw)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            upsert(batch)
+            batch = []
+    if batch:
+        upsert(batch)
+    STORE.flush()
+    return totals
+
+
+def bootstrap_inspection_data() -> Dict[str, int]:
     source = ensure_analysis_source()
     if not source:
-        return []
+        return {"added": 0, "updated": 0, "unchanged": 0}
+    return ingest_analysis_results(source)
 
-    raw = load_json(source)
-    transformed = transform_ai_results(raw)
-    write_json(DATA_FILE, transformed)
-    return transformed
 
+def ensure_inspection_data() -> None:
+    if STORE.exists():
+        return
+    if isinstance(STORE, SqliteRecordStore) and DATA_FILE.exists():
+        # Switching backends: carry the review state over, journaled edits included.
+        STORE.replace_all(JsonRecordStore(DATA_FILE, BACKUP_DIR).all())
+        return
+    bootstrap_inspection_data()
 
-def ensure_inspection_data() -> List[Dict]:
-    return load_inspection_data()
+
+def status_counts() -> Dict[str, int]:
+    counts = STORE.counts()
+    return {status: counts.get(status, 0) for status in sorted(ALLOWED_STATUSES)}
+
+
+def publish_updates(patches: Dict[str, Dict]) -> None:
+    """Tell every open dashboard which fields changed on which records."""
+    BROADCASTER.publish(
+        {
+            "version": STORE.version(),
+            "counts": status_counts(),
+            "updates": [{"id": item_id, "changes": changes} for item_id, changes in patches.items()],
+        }
+    )
 
 
 def load_inspection_data() -> List[Dict]:
-    if DATA_FILE.exists():
-        return load_json(DATA_FILE)
-    return bootstrap_inspection_data()
+    ensure_inspection_data()
+    return STORE.all()
 
 
-def save_inspection_data(data: List[Dict], *, create_backup: bool = True) -> None:
-    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-    if create_backup and DATA_FILE.exists():
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = BACKUP_DIR / f"inspection_data_{timestamp}.json"
-        shutil.copy2(DATA_FILE, backup_path)
-    write_json(DATA_FILE, data)
+REPORT_TAIL = """
+    </div>
+</body>
+</html>
+    """
 
+# Report cards are ~400px wide; 640 covers high-DPI screens. Links open the original.
+REPORT_THUMB_SIZE = 640
 
-def build_report_html(records: List[Dict]) -> str:
+# Fields that affect how a record renders in the report; section cache keys hash these.
+REPORT_FIELDS = ("id", "filename", "image_path", "importance", "description", "task")
+
+
+def group_by_folder(records: List[Dict]) -> Dict[str, List[Dict]]:
     grouped: Dict[str, List[Dict]] = {}
     for item in records:
         grouped.setdefault(item.get("folder", "Uncategorized"), []).append(item)
+    return grouped
 
-    today_str = datetime.today().strftime("%B %d, %Y")
 
-    head = f"""<!doctype html>
+def render_report_head(today_str: str) -> str:
+    return f"""<!doctype html>
 <html lang="en">
 <head>
     <meta charset="utf-8">
@@ -147,6 +257,7 @@ def build_report_html(records: List[Dict]) -> str:
         .section h2 {{ font-size: 1.4rem; font-weight: 600; margin-bottom: 18px; }}
         .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(320px, 1fr)); gap: 26px; }}
         .card {{ background: var(--panel); border: 1px solid var(--border); border-radius: 14px; overflow: hidden; display: flex; flex-direction: column; min-height: 100%; }}
+        .card > a {{ display: block; }}
         .card img {{ width: 100%; aspect-ratio: 3/2; object-fit: cover; background: #0f1218; }}
         .card-body {{ padding: 18px; display: flex; flex-direction: column; gap: 12px; }}
         .pill {{ display: inline-flex; align-items: center; gap: 8px; padding: 8px 12px; border-radius: 999px; font-size: 0.85rem; font-weight: 600; background: rgba(255,255,255,0.05); border: 1px solid var(--border); }}
@@ -169,18 +280,19 @@ def build_report_html(records: List[Dict]) -> str:
         <p class="lede">Curated findings from the latest walkthrough. Items shown here reflect the current approved set in the dashboard.</p>
 """
 
-    sections = []
-    for folder, items in grouped.items():
-        cards = []
-        for item in items:
-            importance = (item.get("importance") or "low").lower()
-            description = item.get("description", "")
-            task = item.get("task", "")
-            img_path = f"/files/{item.get('image_path', '')}"
-            cards.append(
-                f"""
+
+def render_report_section(folder: str, items: List[Dict]) -> str:
+    cards = []
+    for item in items:
+        importance = (item.get("importance") or "low").lower()
+        description = item.get("description", "")
+        task = item.get("task", "")
+        img_path = f"/files/{item.get('image_path', '')}"
+        thumb_path = f"/thumbs/{REPORT_THUMB_SIZE}/{item.get('image_path', '')}"
+        cards.append(
+            f"""
             <article class="card">
-                <img src="{img_path}" alt="{item.get('filename', '')}">
+                <a href="{img_path}" target="_blank"><img src="{thumb_path}" alt="{item.get('filename', '')}" loading="lazy"></a>
                 <div class="card-body">
                     <span class="pill {importance}">{importance.title()} importance</span>
                     <div class="desc">{description}</div>
@@ -188,9 +300,9 @@ def build_report_html(records: List[Dict]) -> str:
                 </div>
             </article>
             """
-            )
+        )
 
-        section_html = f"""
+    return f"""
         <section class="section">
             <h2>{folder}</h2>
             <div class="grid">
@@ -198,15 +310,53 @@ def build_report_html(records: List[Dict]) -> str:
             </div>
         </section>
         """
-        sections.append(section_html)
 
-    body_end = """
-    </div>
-</body>
-</html>
-    """
 
-    return head + "\n".join(sections) + body_end
+def iter_report_html(records: List[Dict], render_section=render_report_section) -> Iterator[str]:
+    """Yield the report in document order: head, one chunk per folder section, tail."""
+    yield render_report_head(datetime.today().strftime("%B %d, %Y"))
+    for index, (folder, items) in enumerate(group_by_folder(records).items()):
+        yield ("\n" if index else "") + render_section(folder, items)
+    yield REPORT_TAIL
+
+
+def build_report_html(records: List[Dict]) -> str:
+    return "".join(iter_report_html(records))
+
+
+# /export caches: the whole document keyed on (dataset version, date), and each folder
+# section keyed on a hash of what it renders, so one edit re-renders only its section.
+# Requests run on several threads; _cache_lock guards both, but not the rendering.
+_report_cache: Dict[str, str] = {"key": "", "html": ""}
+_section_cache: Dict[str, Tuple[str, str]] = {}
+_cache_lock = threading.Lock()
+
+
+def render_cached_section(folder: str, items: List[Dict]) -> str:
+    payload = json.dumps([[item.get(field) for field in REPORT_FIELDS] for item in items])
+    key = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        cached = _section_cache.get(folder)
+    if cached and cached[0] == key:
+        return cached[1]
+    html = render_report_section(folder, items)
+    with _cache_lock:
+        _section_cache[folder] = (key, html)
+    return html
+
+
+def iter_cached_report_html(records: List[Dict], cache_key: str) -> Iterator[str]:
+    """Stream the report chunk by chunk, then memoize the assembled document."""
+    chunks = []
+    for chunk in iter_report_html(records, render_section=render_cached_section):
+        chunks.append(chunk)
+        yield chunk
+    folders = {item.get("folder", "Uncategorized") for item in records}
+    with _cache_lock:
+        _report_cache.update(key=cache_key, html="".join(chunks))
+        for folder in list(_section_cache):
+            if folder not in folders:
+                del _section_cache[folder]
 
 
 @app.route("/")
@@ -215,10 +365,87 @@ def dashboard():
     return render_template("dashboard.html")
 
 
+def parse_bool(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes"}
+
+
 @app.route("/api/data")
 def api_data():
-    data = load_inspection_data()
-    return jsonify(data)
+    """
+    Without query parameters this returns every record, as before. Optional parameters:
+      status, folder, severity, importance, has_issues -- equality filters
+      fields=id,status,...  -- project each record onto these keys (id is always kept)
+      limit, cursor         -- page through results; the response becomes
+                               {"items": [...], "next_cursor": ..., "version": ...}
+    The version can be handed to /api/changes to pick up later edits.
+    """
+    ensure_inspection_data()
+    criteria = {}
+    for field in ALLOWED_FILTER_FIELDS:
+        value = request.args.get(field)
+        if value is not None:
+            criteria[field] = parse_bool(value) if field == "has_issues" else value
+
+    limit = request.args.get("limit", type=int)
+    cursor = request.args.get("cursor", type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    # Read before the page so an edit racing this request is re-sent, never missed.
+    version = STORE.version()
+    items, next_cursor = STORE.page(criteria, limit=limit, after=cursor)
+
+    fields = request.args.get("fields")
+    if fields:
+        keep = {name.strip() for name in fields.split(",") if name.strip()} | {"id"}
+        items = [{k: v for k, v in item.items() if k in keep} for item in items]
+
+    if limit is None:
+        return jsonify(items)
+    return jsonify({"items": items, "next_cursor": next_cursor, "version": version})
+
+
+@app.route("/api/changes")
+def api_changes():
+    """
+    Records modified after ?since=<version>, plus current per-status counts. If
+    "reset" is true the client is too far behind and should reload from /api/data.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"error": "Missing since version"}), 400
+    ensure_inspection_data()
+    items, version, reset = STORE.changes_since(since)
+    return jsonify({"version": version, "reset": reset, "items": items, "counts": status_counts()})
+
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-Sent Events: one "update" event per successful write, see publish_updates()."""
+    subscriber = BROADCASTER.subscribe()
+    response = Response(BROADCASTER.stream(subscriber), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/counts")
+def api_counts():
+    ensure_inspection_data()
+    return jsonify(status_counts())
+
+
+def clean_updates(payload: Dict):
+    """Return (updates, error) with only allowed fields kept and status validated."""
+    updates = {k: v for k, v in payload.items() if k in ALLOWED_UPDATE_FIELDS}
+    if not updates:
+        return None, "No updates provided"
+    if "status" in updates and updates["status"] not in ALLOWED_STATUSES:
+        return None, "Invalid status value"
+    if "description" in updates:
+        # Keeps the next ingest from replacing the reviewer's wording with the AI's.
+        updates[EDITED_FLAG] = True
+    return updates, None
 
 
 @app.route("/api/update", methods=["POST"])
@@ -228,32 +455,82 @@ def api_update():
     if not item_id:
         return jsonify({"error": "Missing item id"}), 400
 
-    updates = {k: v for k, v in payload.items() if k in ALLOWED_UPDATE_FIELDS}
-    if not updates:
-        return jsonify({"error": "No updates provided"}), 400
+    updates, error = clean_updates(payload)
+    if error:
+        return jsonify({"error": error}), 400
 
-    if "status" in updates and updates["status"] not in ALLOWED_STATUSES:
-        return jsonify({"error": "Invalid status value"}), 400
+    ensure_inspection_data()
+    item = STORE.update(item_id, updates)
+    if item is None:
+        return jsonify({"error": "Item not found"}), 404
+    publish_updates({item_id: updates})
+    return jsonify({"status": "ok", "item": item})
 
-    data = load_inspection_data()
-    for item in data:
-        if item.get("id") == item_id:
-            item.update(updates)
-            save_inspection_data(data)
-            return jsonify({"status": "ok", "item": item})
 
-    return jsonify({"error": "Item not found"}), 404
+@app.route("/api/update/batch", methods=["POST"])
+def api_update_batch():
+    """
+    Apply many updates in one write. Accepts either
+        {"patches": [{"id": ..., "status": ...}, ...]}
+    or a filter plus the fields to set on every match:
+        {"filter": {"status": "pending", "folder": "...", "severity": "none"}, "set": {"status": "rejected"}}
+    Nothing is written unless every patch is valid and every id exists.
+    """
+    payload = request.get_json(silent=True) or {}
+    ensure_inspection_data()
+
+    patches: Dict[str, Dict] = {}
+    if "patches" in payload:
+        if not isinstance(payload["patches"], list):
+            return jsonify({"error": "patches must be a list"}), 400
+        for patch in payload["patches"]:
+            item_id = patch.get("id") if isinstance(patch, dict) else None
+            if not item_id:
+                return jsonify({"error": "Missing item id"}), 400
+            updates, error = clean_updates(patch)
+            if error:
+                return jsonify({"error": f"{item_id}: {error}"}), 400
+            patches.setdefault(item_id, {}).update(updates)
+    elif "filter" in payload:
+        criteria = payload.get("filter") or {}
+        if not isinstance(criteria, dict) or not criteria:
+            return jsonify({"error": "Missing filter"}), 400
+        unknown = set(criteria) - ALLOWED_FILTER_FIELDS
+        if unknown:
+            return jsonify({"error": f"Unsupported filter fields: {', '.join(sorted(unknown))}"}), 400
+        updates, error = clean_updates(payload.get("set") or {})
+        if error:
+            return jsonify({"error": error}), 400
+        patches = {item["id"]: updates for item in STORE.find(criteria)}
+    else:
+        return jsonify({"error": "Provide either patches or filter"}), 400
+
+    try:
+        items = STORE.update_many(patches)
+    except KeyError as exc:
+        return jsonify({"error": "Items not found", "missing": exc.args[0]}), 404
+    if patches:
+        publish_updates(patches)
+    return jsonify({"status": "ok", "updated": len(items), "items": items})
 
 
 @app.route("/export")
 def export_report():
-    data = load_inspection_data()
-    approved = [item for item in data if item.get("status") == "approved"]
-    html = build_report_html(approved)
-    response = Response(html, mimetype="text/html")
+    ensure_inspection_data()
+    cache_key = f"{STORE.version()}-{date.today().isoformat()}"
+    with _cache_lock:
+        cached_key, cached_html = _report_cache["key"], _report_cache["html"]
+    if cached_key == cache_key:
+        body = cached_html
+    else:
+        body = iter_cached_report_html(STORE.find({"status": "approved"}), cache_key)
+    response = Response(body, mimetype="text/html")
     if request.args.get("download"):
         response.headers["Content-Disposition"] = "attachment; filename=Rove_Final_Report.html"
-    return response
+    # Lets the preview iframe revalidate with a 304 when nothing has changed.
+    response.set_etag(cache_key)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 
 @app.route("/files/<path:filename>")
@@ -262,6 +539,40 @@ def serve_files(filename: str):
     return send_from_directory(BASE_DIR, filename)
 
 
+@app.route("/thumbs/<int:size>/<path:filename>")
+def serve_thumbnail(size: int, filename: str):
+    """Downscaled WebP (or JPEG for clients that don't accept WebP) of an image under BASE_DIR."""
+    if size not in thumbnails.ALLOWED_SIZES:
+        abort(404)
+    if not thumbnails.available() or not filename.lower().endswith(thumbnails.IMAGE_EXTENSIONS):
+        return send_from_directory(BASE_DIR, filename)
+    source = safe_join(str(BASE_DIR), filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    try:
+        path = THUMBS.get(Path(source), size, fmt)
+    except thumbnails.DECODE_ERRORS as exc:
+        # A photo Pillow can't read is still worth showing if the browser can.
+        print(f"Thumbnail failed for {filename}: {exc}; serving the original")
+        return send_from_directory(BASE_DIR, filename)
+    response = send_file(path, mimetype=thumbnails.FORMATS[fmt][0], max_age=3600)
+    response.vary.add("Accept")
+    return response
+
+
+@app.cli.command("ingest")
+@click.argument("source", required=False, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def ingest_command(source: Optional[Path]):
+    """Merge analysis results (JSON array or JSONL) into the store, keeping review edits."""
+    source = source or ensure_analysis_source()
+    if source is None:
+        raise click.ClickException("No analysis_results.json found")
+    totals = ingest_analysis_results(source)
+    print(f"Ingested {source}: {totals['added']} added, {totals['updated']} updated, {totals['unchanged']} unchanged")
+
+
 if __name__ == "__main__":
     ensure_inspection_data()
     port = int(os.getenv("PORT", "5050"))
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import fake_llm_server
+from telemetry import percentile
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+# Folder layouts mirror the folder constants at the top of each script; every run
+# gets a fresh directory, so caches and outputs start cold.
+ANALYZER_FOLDERS = [
+    '8 Barnes Avenue Nov 3 Inspection',
+    '8 Barnes Avenue Dec 1 Inspection',
+    '8 Barnes Avenue Nov 3 Clean',
+    '8 Barnes Avenue Nov 30 Clean'
+]
+SORT_FOLDERS = ['New_Photos', 'Old_Photos']
+TIMELINE_DAMAGE_DIR = 'all_damages'
+TIMELINE_FOLDERS = ['Inspection_Dec1', 'Inspection_Dec2', 'Inspection_Nov17', 'Inspection_Nov21']
+
+
+def generate_images(directory: Path, count: int, size, duplicate_rate: float, seed: int) -> List[Path]:
+    """
+    Synthetic photos: random blocks over film grain (so JPEGs are photo-sized, not
+    flat colour). duplicate_rate of them are lightly perturbed copies of the previous
+    photo, like an inspector's burst shots.
+    """
+    from PIL import Image, ImageDraw, ImageEnhance
+
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    width, height = size
+    paths = []
+    previous = None
+    burst = 0
+    for index in range(count):
+        if previous is not None and rng.random() < duplicate_rate:
+            shift = rng.randint(2, 12)
+            img = previous.crop((shift, shift, width - shift, height - shift)).resize((width, height))
+            img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.93, 1.07))
+        else:
+            burst += 1
+            img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(img)
+            for _ in range(rng.randint(8, 20)):
+                x, y = rng.randrange(width), rng.randrange(height)
+                draw.rectangle([x, y, x + rng.randrange(width // 3), y + rng.randrange(height // 3)],
+                               fill=tuple(rng.randrange(256) for _ in range(3)))
+            grain = Image.effect_noise((width, height), 24).convert('RGB')
+            img = Image.blend(img, grain, 0.15)
+        path = directory / f"burst{burst:05d}_{index:05d}.jpg"
+        img.save(path, quality=90)
+        paths.append(path)
+        previous = img
+    return paths
+
+
+def place(source: Path, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def layout_analyzer(images: List[Path], run_dir: Path, args) -> int:
+    # Burst shots share a folder and a task name, the way "Sink 1.jpg", "Sink 2.jpg" do.
+    for index, image in enumerate(images):
+        burst = int(image.stem.split("_")[0][len("burst"):])
+        folder = ANALYZER_FOLDERS[burst % len(ANALYZER_FOLDERS)]
+        place(image, run_dir / folder / f"- Item {burst} {index}.jpg")
+    return len(images)
+
+
+def layout_sort(images: List[Path], run_dir: Path, args) -> int:
+    for index, image in enumerate(images):
+        place(image, run_dir / SORT_FOLDERS[index % len(SORT_FOLDERS)] / image.name)
+    return len(images)
+
+
+def layout_timeline(images: List[Path], run_dir: Path, args) -> int:
+    references = images[:args.references]
+    candidates = images[args.references:]
+    for image in references:
+        place(image, run_dir / TIMELINE_DAMAGE_DIR / image.name)
+    for index, image in enumerate(candidates):
+        place(image, run_dir / TIMELINE_FOLDERS[index % len(TIMELINE_FOLDERS)] / f"c_{image.name}")
+    # Every reference is compared against every candidate.
+    return len(references) * len(candidates)
+
+
+SCRIPTS = {
+    'analyzer': ('inspection_analyzer.py', layout_analyzer),
+    'script': ('script.py', layout_sort),
+    'sorting': ('sorting_script.py', layout_timeline),
+}
+
+
+def client_latencies(run_dir: Path) -> List[float]:
+    """
+    Sorted end-to-end seconds per work unit from the script's own telemetry.jsonl,
+    so prep, queueing, rate limiting and retries count, not just the fake server's delay.
+    """
+    latencies = []
+    for path in run_dir.rglob('telemetry.jsonl'):
+        with open(path, 'r', encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if event.get('kind') == 'unit':
+                    latencies.append(float(event['latency_s']))
+    return sorted(latencies)
+
+
+def run_script(name: str, images: List[Path], work_dir: Path, fake, base_url: str, args) -> Dict:
+    script, layout = SCRIPTS[name]
+    run_dir = work_dir / name
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    run_dir.mkdir(parents=True)
+    image_count = layout(images, run_dir, args)
+
+    env = dict(os.environ)
+    env.update({
+        'LLM_BASE_URL': base_url,
+        'OPENROUTER_API_KEY': 'benchmark',
+        'ANALYZER_RPM': '0',
+    })
+    env.update(dict(item.split('=', 1) for item in args.env))
+
+    fake.reset()
+    with open(run_dir / 'run.log', 'wb') as log:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, str(PACKAGE_DIR / script)], cwd=run_dir, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the peak RSS of the script (and the prep processes it reaped).
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    stats = fake.stats()
+    latencies = client_latencies(run_dir)
+    return {
+        'script': name,
+        'images': image_count,
+        'exit_code': process.returncode,
+        'wall_s': round(wall, 2),
+        'images_per_s': round(image_count / wall, 2) if wall else 0.0,
+        'requests': stats['requests'],
+        'statuses': stats['statuses'],
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'latency_p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'server_latency_p50_ms': round(stats['latency_p50'] * 1000, 1),
+        'bytes_uploaded': stats['bytes_in'],
+        'peak_rss_mb': round(peak_rss, 1),
+        'log': str(run_dir / 'run.log'),
+    }
+
+
+def print_results(results: List[Dict], baseline: Dict) -> None:
+    columns = ('images_per_s', 'latency_p50_ms', 'latency_p95_ms', 'bytes_uploaded', 'peak_rss_mb')
+    print(f"\n{'script':<10}{'images':>8}{'img/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'MB up':>10}{'RSS MB':>10}{'reqs':>7}  exit")
+    for result in results:
+        print(f"{result['script']:<10}{result['images']:>8}{result['images_per_s']:>10}"
+              f"{result['latency_p50_ms']:>10}{result['latency_p95_ms']:>10}"
+              f"{result['bytes_uploaded'] / 1e6:>10.1f}{result['peak_rss_mb']:>10}{result['requests']:>7}"
+              f"  {result['exit_code']}")
+        previous = baseline.get(result['script'])
+        if previous:
+            deltas = []
+            for column in columns:
+                if previous.get(column):
+                    change = (result[column] - previous[column]) / previous[column] * 100
+                    deltas.append(f"{column} {change:+.0f}%")
+            print(f"{'':<10}vs baseline: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end throughput benchmark of the analysis scripts against fake_llm_server"
+    )
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"Comma-separated subset of {', '.join(SCRIPTS)}")
+    parser.add_argument("--images", type=int, default=100, help="Synthetic photos per script")
+    parser.add_argument("--size", default="2000x1500", help="Synthetic photo size, WIDTHxHEIGHT")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Fraction of burst-shot near-duplicates")
+    parser.add_argument("--references", type=int, default=2, help="Damage reference photos for sorting_script")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the scripts, e.g. ANALYZER_BATCH_SIZE=4 (repeatable)")
+    parser.add_argument("--work-dir", help="Keep generated folders and logs here instead of a temp dir")
+    parser.add_argument("--json", help="Write results to this file (use as a later --baseline)")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    fake_llm_server.add_arguments(parser)
+    parser.set_defaults(latency_ms=300.0, seed=1)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scripts.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCRIPTS]
+    if unknown:
+        parser.error(f"unknown script(s): {', '.join(unknown)}")
+    size = tuple(int(part) for part in args.size.lower().split("x"))
+
+    fake = fake_llm_server.fake_from_args(args)
+    server = fake_llm_server.serve(fake)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="inspection-bench-"))
+    try:
+        print(f"🖼️  Generating {args.images} synthetic {args.size} photos in {work_dir}...")
+        images = generate_images(work_dir / "source", args.images, size, args.duplicates, args.seed)
+
+        results = []
+        for name in names:
+            print(f"⏱️  Running {SCRIPTS[name][0]}...")
+            result = run_script(name, images, work_dir, fake, base_url, args)
+            results.append(result)
+            if result['exit_code']:
+                print(f"   ⚠️  exited with {result['exit_code']}; see {result['log']}")
+
+        baseline = {}
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as handle:
+                baseline = {entry['script']: entry for entry in json.load(handle)}
+        print_results(results, baseline)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as handle:
+                json.dump(results, handle, indent=2)
+            print(f"\n💾 Results written to {args.json}")
+    finally:
+        server.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so run one writer at a time there.
+    fcntl = None
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_JOURNAL_DIR = BASE_DIR / "backups"
+
+SNAPSHOT_PREFIX = "snapshot_"
+ARCHIVE_PREFIX = "journal_"
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S_%f"
+
+
+class ChangeJournal:
+    """
+    Append-only log of per-field edits plus periodic full snapshots.
+
+    Each edit appends one JSON line per changed field:
+        {"seq": 12, "ts": "...", "id": "folder/file.jpg", "field": "status", "old": "pending", "new": "approved"}
+    A {"seq", "ts", "reset": true} entry marks a wholesale replacement of the records
+    (bootstrap or an outside edit of the data file); readers of the change feed must
+    reload everything when they are behind one.
+    A snapshot is a full copy of the records as of a given seq. Any point in time can
+    be rebuilt from the newest snapshot before it plus the journal lines after it.
+    The checkpoint file stores the last seq already written back to the main data file.
+    Taking a snapshot moves the entries up to it into an archive segment
+    (journal_<last seq>.jsonl), so the live journal only holds what is not yet folded
+    into the data file; restore() reads the archives as well.
+
+    Writers in several processes coordinate through locked(), an exclusive flock on
+    journal.lock, and catch_up() to learn the seqs the others used.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.journal_path = directory / "journal.jsonl"
+        self.checkpoint_path = directory / "journal.checkpoint"
+        self.lock_path = directory / "journal.lock"
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_handle = None
+        self.seq = self.checkpoint()
+        for entry in self.entries():
+            self.seq = max(self.seq, entry["seq"])
+
+    @contextmanager
+    def locked(self):
+        """Hold the journal exclusively across threads and processes; re-entrant."""
+        with self._thread_lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._lock_handle = self.lock_path.open("a")
+                fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_handle is not None:
+                    fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+                    self._lock_handle.close()
+                    self._lock_handle = None
+
+    def stamp(self):
+        """Identity of the live journal file; changes whenever anyone appends or archives it."""
+        try:
+            stat = self.journal_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def catch_up(self) -> List[Dict]:
+        """Entries written by other processes since this one last wrote or read; advances seq."""
+        entries = list(self.entries(after_seq=self.seq, archived=True))
+        self.seq = max([self.seq, self.checkpoint()] + [entry["seq"] for entry in entries])
+        return entries
+
+    def record(self, changes: List[Tuple[str, Dict, Dict]]) -> List[Dict]:
+        """
+        Append one entry per changed field for each (item_id, before, after) and fsync
+        once for the whole batch. Returns the appended entries.
+        """
+        timestamp = datetime.now().isoformat(timespec="microseconds")
+        appended = []
+        for item_id, before, after in changes:
+            for field, new in after.items():
+                self.seq += 1
+                appended.append(
+                    {"seq": self.seq, "ts": timestamp, "id": item_id, "field": field, "old": before.get(field), "new": new}
+                )
+        if appended:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a", encoding="utf-8") as handle:
+                handle.write("".join(json.dumps(entry) + "\n" for entry in appended))
+                handle.flush()
+                os.fsync(handle.fileno())
+        return appended
+
+    def mark_reset(self) -> int:
+        """Append a reset marker and return its seq."""
+        self.seq += 1
+        entry = {"seq": self.seq, "ts": datetime.now().isoformat(timespec="microseconds"), "reset": True}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.journal_path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        return self.seq
+
+    def archives(self) -> List[Tuple[int, Path]]:
+        """Archived journal segments as (last seq, path), oldest first."""
+        found = []
+        for path in self.directory.glob(f"{ARCHIVE_PREFIX}*.jsonl"):
+            try:
+                found.append((int(path.stem[len(ARCHIVE_PREFIX):]), path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def entries(self, after_seq: int = 0, until: Optional[datetime] = None,
+                archived: bool = False) -> Iterator[Dict]:
+        """Entries after after_seq from the live journal, preceded by the archives if archived."""
+        paths = [path for last_seq, path in self.archives() if last_seq > after_seq] if archived else []
+        paths.append(self.journal_path)
+        for path in paths:
+            if not path.exists():
+                continue
+            with path.open("r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append; everything before it is intact.
+                        continue
+                    if entry["seq"] <= after_seq:
+                        continue
+                    if until is not None and datetime.fromisoformat(entry["ts"]) > until:
+                        return
+                    yield entry
+
+    def checkpoint(self) -> int:
+        if not self.checkpoint_path.exists():
+            return 0
+        return int(self.checkpoint_path.read_text().strip() or 0)
+
+    def pending(self) -> int:
+        """Number of journal entries not yet folded into the main data file."""
+        return self.seq - self.checkpoint()
+
+    def snapshot(self, records: List[Dict]) -> Path:
+        """
+        Write a full snapshot at the current seq, move the checkpoint up to it and
+        archive the journal entries it covers.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        path = self.directory / f"{SNAPSHOT_PREFIX}{stamp}_{self.seq}.json"
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(records, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        tmp_path.write_text(str(self.seq))
+        os.replace(tmp_path, self.checkpoint_path)
+        if self.journal_path.exists() and self.journal_path.stat().st_size:
+            os.replace(self.journal_path, self.directory / f"{ARCHIVE_PREFIX}{self.seq:012d}.jsonl")
+        return path
+
+    def snapshots(self) -> List[Dict]:
+        """Known snapshots as {"path", "ts", "seq"}, oldest first."""
+        found = []
+        for path in self.directory.glob(f"{SNAPSHOT_PREFIX}*.json"):
+            stamp, _, seq = path.stem[len(SNAPSHOT_PREFIX):].rpartition("_")
+            try:
+                found.append({"path": path, "ts": datetime.strptime(stamp, TIMESTAMP_FORMAT), "seq": int(seq)})
+            except ValueError:
+                continue
+        return sorted(found, key=lambda snap: snap["seq"])
+
+    def restore(self, at: datetime) -> List[Dict]:
+        """Rebuild the record list as it was at `at`."""
+        base = [snap for snap in self.snapshots() if snap["ts"] <= at]
+        if not base:
+            raise ValueError(f"No snapshot at or before {at.isoformat()}")
+        snap = base[-1]
+        with snap["path"].open("r", encoding="utf-8") as handle:
+            records = json.load(handle)
+        apply_entries(records, self.entries(after_seq=snap["seq"], until=at, archived=True))
+        return records
+
+
+def apply_entries(records: List[Dict], entries) -> None:
+    """Replay journal entries onto records in place. Entries are plain sets, so replay is idempotent."""
+    index = {item.get("id"): item for item in records}
+    for entry in entries:
+        if entry.get("reset"):
+            continue
+        item = index.get(entry["id"])
+        if item is not None:
+            item[entry["field"]] = entry["new"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild inspection records as of a point in time.")
+    parser.add_argument("--at", required=True, help="ISO timestamp, e.g. 2025-12-01T14:30")
+    parser.add_argument("--output", required=True, type=Path, help="Where to write the restored JSON array")
+    parser.add_argument("--journal-dir", type=Path, default=DEFAULT_JOURNAL_DIR)
+    args = parser.parse_args()
+
+    journal = ChangeJournal(args.journal_dir)
+    records = journal.restore(datetime.fromisoformat(args.at))
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(records, handle, indent=2)
+    print(f"Restored {len(records)} records as of {args.at} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class DiskCache:
+    """
+    Size-bounded directory of derived files, one file per key under a two-character
+    fan-out directory. Hits bump the file's mtime; once the total grows past
+    max_bytes the least recently used files are deleted.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{suffix}"
+
+    def lookup(self, key: str, suffix: str) -> Optional[Path]:
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def read(self, key: str, suffix: str) -> Optional[bytes]:
+        path = self.lookup(key, suffix)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # Evicted between lookup and read
+            return None
+
+    def write(self, key: str, suffix: str, data: bytes) -> Path:
+        """Store data atomically (write beside the target, then rename) and evict if over budget."""
+        target = self.path_for(key, suffix)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as out:
+                out.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._account(len(data), keep=target)
+        return target
+
+    def _account(self, written: int, keep: Path) -> None:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(path.stat().st_size for path in self.cache_dir.glob("*/*") if path.is_file())
+            else:
+                self._total_bytes += written
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep)
+
+    def _evict(self, keep: Path) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        # Drop to 90% so we don't evict again on the very next miss.
+        budget = int(self.max_bytes * 0.9)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= budget:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
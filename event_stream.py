@@ -0,0 +1,71 @@
+import json
+import queue
+import threading
+from typing import Dict, Iterator, Optional, Set
+
+# Seconds between keep-alive comments so proxies don't drop idle streams.
+HEARTBEAT_SECONDS = 15
+# Events buffered per client before it is considered too slow and told to resync.
+MAX_PENDING_EVENTS = 256
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: "queue.Queue[Dict]" = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.overflowed = False
+
+
+class Broadcaster:
+    """Fan-out of update events to every connected Server-Sent Events client."""
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: Dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                # Rather than block the writer, drop the client; it catches up via /api/changes.
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+
+    def stream(self, subscriber: Subscriber) -> Iterator[str]:
+        """SSE body for one client: "update" events, keep-alives, and "resync" if it fell behind."""
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = self._next(subscriber)
+                if subscriber.overflowed:
+                    yield format_sse("resync", {})
+                    return
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse("update", event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    @staticmethod
+    def _next(subscriber: Subscriber) -> Optional[Dict]:
+        try:
+            return subscriber.queue.get(timeout=HEARTBEAT_SECONDS)
+        except queue.Empty:
+            return None
+
+
+def format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,237 @@
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from telemetry import percentile
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+
+class FakeLLM:
+    """Response policy and request statistics, shared by all handler threads."""
+
+    def __init__(self, latency_ms: float = 500.0, latency_dist: str = 'lognormal', latency_spread: float = 0.5,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 positive_rate: float = 0.2, canned: Optional[List[Dict]] = None, seed: Optional[int] = None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.positive_rate = positive_rate
+        self.canned = canned or []
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.statuses: Dict[int, int] = {}
+            self.bytes_in = 0
+            self.images = 0
+            self.latencies: List[float] = []
+
+    def _latency(self) -> float:
+        mean = self.latency_ms / 1000.0
+        with self._lock:
+            if self.latency_dist == 'fixed':
+                return mean
+            if self.latency_dist == 'uniform':
+                return max(0.0, self.random.uniform(mean * (1 - self.latency_spread), mean * (1 + self.latency_spread)))
+            # Lognormal with the requested mean: a long right tail, like real model latency.
+            sigma = self.latency_spread
+            return self.random.lognormvariate(0, sigma) * mean / math.exp(sigma * sigma / 2)
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self.random.random()
+
+    def handle(self, body: bytes):
+        """(status, headers, payload) for one chat completion request."""
+        started = time.perf_counter()
+        try:
+            request = json.loads(body)
+            content = request["messages"][0]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return self._finish(started, body, 0, 400, {}, {"error": {"message": "malformed request"}})
+
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        text = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+        images = sum(1 for part in content if part.get("type") == "image_url")
+
+        time.sleep(self._latency())
+        roll = self._roll()
+        if roll < self.throttle_rate:
+            return self._finish(started, body, images, 429, {"Retry-After": f"{self.retry_after:g}"},
+                                {"error": {"message": "Rate limit exceeded (fake)", "code": 429}})
+        if roll < self.throttle_rate + self.error_rate:
+            return self._finish(started, body, images, 500, {},
+                                {"error": {"message": "Internal error (fake)", "code": 500}})
+
+        reply = json.dumps(self._reply(text, images))
+        prompt_tokens = len(text) // 4 + images * 258
+        completion_tokens = len(reply) // 4
+        payload = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return self._finish(started, body, images, 200, {}, payload)
+
+    def _finish(self, started, body, images, status, headers, payload):
+        with self._lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes_in += len(body)
+            self.images += images
+            self.latencies.append(time.perf_counter() - started)
+        return status, headers, payload
+
+    def _reply(self, text: str, images: int) -> Dict:
+        for entry in self.canned:
+            if entry.get("match", "") in text:
+                return entry["response"]
+        positive = lambda: self._roll() < self.positive_rate
+        # Screening prompts (model_cascade) ask for a confidence; most answers are sure.
+        confidence = (lambda: {"confidence": round(1 - self._roll() ** 3 / 2, 2)}) if '"confidence"' in text else dict
+        if '"results"' in text:
+            return {"results": [
+                {"index": i, "has_issues": positive(), "description": "synthetic result", "severity": "minor",
+                 **confidence()}
+                for i in range(1, images + 1)
+            ]}
+        if "has_damage" in text:
+            return {"has_damage": positive(), "reason": "synthetic result", **confidence()}
+        if '"matches"' in text:
+            return {"matches": [i for i in range(1, images) if positive()]}
+        return {"has_issues": positive(), "description": "synthetic result", "severity": "minor", **confidence()}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "requests": self.requests,
+                "statuses": dict(self.statuses),
+                "bytes_in": self.bytes_in,
+                "images": self.images,
+                "latency_p50": percentile(latencies, 50),
+                "latency_p95": percentile(latencies, 95),
+            }
+
+
+def make_handler(fake: FakeLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, as the real API does
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                status, headers, payload = 404, {}, {"error": {"message": f"unknown path {self.path}"}}
+            else:
+                status, headers, payload = fake.handle(body)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # /stats for a peek at what the server has seen so far
+            data = json.dumps(fake.stats()).encode("utf-8")
+            self.send_response(200 if self.path.rstrip("/").endswith("/stats") else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(fake: FakeLLM, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake in a background thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Mean simulated model latency")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="Relative spread (uniform) or sigma (lognormal)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--positive-rate", type=float, default=0.2, help="Fraction of images reported as damaged")
+    parser.add_argument("--canned", help="JSON file: list of {\"match\": prompt substring, \"response\": object}")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def fake_from_args(args) -> FakeLLM:
+    canned = None
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as handle:
+            canned = json.load(handle)
+    return FakeLLM(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        positive_rate=args.positive_rate,
+        canned=canned,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for an OpenAI-compatible chat completions API. Replies are shaped "
+                    "after the prompt each analysis script sends, or come from a --canned file.",
+        epilog="Then: LLM_BASE_URL=http://127.0.0.1:8808/v1 python inspection_analyzer.py"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = fake_from_args(args)
+    server = serve(fake, args.host, args.port)
+    print(f"Fake LLM listening on http://{args.host}:{server.server_port}/v1")
+    print(f"   export LLM_BASE_URL=http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(fake.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
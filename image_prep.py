@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+
+from disk_cache import DiskCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Only needed once an image actually has to be decoded.
+    Image = None
+    ImageOps = None
+
+# Defaults for images sent to the model. Each script may pass its own max_res.
+MAX_RES = int(os.getenv('IMAGE_MAX_RES', '1536'))
+FORMAT = os.getenv('IMAGE_FORMAT', 'jpeg').lower()
+QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+
+CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', '.image_cache')
+CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MB', '1024')) * 1024 * 1024
+
+# Bump when the pipeline below changes output for the same settings.
+PIPELINE_VERSION = 1
+
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', lambda quality: {'quality': quality, 'optimize': True}),
+    'webp': ('WEBP', 'image/webp', lambda quality: {'quality': quality, 'method': 4}),
+    'png': ('PNG', 'image/png', lambda quality: {'optimize': True}),
+}
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+_SHA_MEMO = {}
+
+
+def get_cache():
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DiskCache(CACHE_DIR, CACHE_MAX_BYTES)
+        return _CACHE
+
+
+def source_sha256(path):
+    """SHA-256 of the file, memoized per (path, mtime, size) for the life of the process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _SHA_MEMO.get(memo_key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _SHA_MEMO[memo_key] = digest
+    return digest
+
+
+def open_oriented(path, max_res):
+    """
+    Decode an image upright (EXIF orientation applied) in RGB, no larger than
+    max_res on its longest side. JPEGs are decoded in draft mode, which lets libjpeg
+    scale down by 1/2, 1/4 or 1/8 while decoding instead of after.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required for image preparation (pip install pillow)")
+    with Image.open(path) as img:
+        img.draft('RGB', (max_res, max_res))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail((max_res, max_res))
+        img.load()
+        return img
+
+
+def encode(img, fmt, quality, **extra):
+    """Encode img; extra Pillow save options (e.g. progressive=True) override the format's defaults."""
+    pil_format, _, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    img.save(buffer, format=pil_format, **dict(options(quality), **extra))
+    return buffer.getvalue()
+
+
+def prepare_image(path, max_res=None, fmt=None, quality=None, use_cache=True, timings=None):
+    """
+    Downscaled, re-encoded bytes for an image, as (mime_type, data). Results are
+    cached on disk keyed on the source's SHA-256 plus the settings, so a photo is
+    only decoded and encoded once per setting. If a timings dict is passed, read_s,
+    decode_s, encode_s and cached are filled in.
+    """
+    max_res = max_res or MAX_RES
+    fmt = (fmt or FORMAT).lower()
+    quality = quality or QUALITY
+    mime = FORMATS[fmt][1]
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+
+    key = None
+    if use_cache:
+        settings = f"{source_sha256(path)}|{max_res}|{fmt}|{quality}|{PIPELINE_VERSION}"
+        key = hashlib.sha256(settings.encode('utf-8')).hexdigest()
+        cached = get_cache().read(key, fmt)
+        if cached is not None:
+            timings.update(read_s=time.perf_counter() - started, decode_s=0.0, encode_s=0.0, cached=True)
+            return mime, cached
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    read_done = time.perf_counter()
+    img = open_oriented(io.BytesIO(raw), max_res)
+    decode_done = time.perf_counter()
+    data = encode(img, fmt, quality)
+    timings.update(read_s=read_done - started, decode_s=decode_done - read_done,
+                   encode_s=time.perf_counter() - decode_done, cached=False)
+    if key is not None:
+        get_cache().write(key, fmt, data)
+    return mime, data
+
+
+def image_data_url(path, timings=None, **settings):
+    """data: URL for an OpenAI-style image_url content part."""
+    timings = {} if timings is None else timings
+    mime, data = prepare_image(path, timings=timings, **settings)
+    started = time.perf_counter()
+    url = f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+    timings['encode_s'] = timings.get('encode_s', 0.0) + time.perf_counter() - started
+    timings['encoded_bytes'] = len(url)
+    return url
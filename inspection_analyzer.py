@@ -1,23 +1,29 @@
-import base64
 import json
 import os
 import re
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+from contextlib import contextmanager
 
-# Load environment variables
-load_dotenv()
+try:
+    import fcntl
+except ImportError:  # Windows: don't run the watcher alongside a batch run there.
+    fcntl = None
 
-# Configuration
-OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-if not OPENROUTER_API_KEY:
-    print("Error: OPENROUTER_API_KEY not found in .env file")
-    exit()
+import image_prep
+from api_client import create_client, missing_api_key
+from model_cascade import CONFIDENCE_INSTRUCTION, Cascade
+from phash_index import PerceptualHashIndex
+from pipeline import Pipeline
+from rate_limiter import RateLimiter
+from request_executor import RequestExecutor
+from result_cache import ResultCache, prompt_version
+from telemetry import Telemetry, content_bytes
 
-CLIENT = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY
-)
+# Configuration: OpenRouter by default, or LLM_BASE_URL (e.g. fake_llm_server.py).
+# CLIENT, RESULT_CACHE, TELEMETRY and HASH_INDEX are created by setup(), not at import,
+# so the pipeline's prep processes (which re-import this script as __mp_main__) open
+# no clients, files or databases.
+CLIENT = None
 
 # Directories to scan
 INSPECTION_FOLDERS = [
@@ -29,7 +35,94 @@ INSPECTION_FOLDERS = [
 
 # Output directory
 OUTPUT_DIR = 'Analysis_Results'
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Concurrency: most photos analyzed at once (1 = the old one-at-a-time behaviour) and an
+# overall cap on API calls per minute (0 = no cap). The executor backs off below
+# MAX_IN_FLIGHT while the provider is throttling and climbs back once it recovers.
+MAX_IN_FLIGHT = int(os.getenv('ANALYZER_MAX_IN_FLIGHT', '8'))
+REQUESTS_PER_MINUTE = float(os.getenv('ANALYZER_RPM', '120'))
+RATE_LIMITER = RateLimiter(REQUESTS_PER_MINUTE)
+EXECUTOR = RequestExecutor(
+    MAX_IN_FLIGHT,
+    max_retries=int(os.getenv('ANALYZER_MAX_RETRIES', '5')),
+    rate_limiter=RATE_LIMITER
+)
+
+MODEL = os.getenv('ANALYZER_MODEL', "google/gemini-2.5-flash")
+
+# With ANALYZER_CASCADE=1 a cheaper SCREEN_MODEL sees every photo first; only issues, or
+# verdicts below ANALYZER_ESCALATE_CONFIDENCE, are re-checked by MODEL.
+CASCADE = Cascade(
+    os.getenv('ANALYZER_SCREEN_MODEL', 'google/gemini-2.5-flash-lite'),
+    MODEL,
+    min_confidence=float(os.getenv('ANALYZER_ESCALATE_CONFIDENCE', '0.8')),
+    flag='has_issues'
+) if os.getenv('ANALYZER_CASCADE', '').lower() in ('1', 'true', 'yes') else None
+
+# What counts as damage; shared by the single-photo and batch prompts so they can't drift apart.
+DAMAGE_RULES = (
+    "STRICT REQUIREMENTS:\n"
+    "- ONLY flag 'has_issues' as true if there is visible physical damage (cracks, breaks, dents, scratches, "
+    "tears, stains that indicate damage, missing parts, structural issues, etc.).\n"
+    "- Do NOT flag normal wear, minor cosmetic imperfections, or general condition issues.\n"
+    "- Do NOT flag cleanliness, messes, or task completion status.\n"
+    "- Be very strict: only clear, obvious physical damage should be flagged.\n"
+    "- If there is any doubt or the damage is minimal/normal wear, mark 'has_issues' as false.\n\n"
+)
+
+PROMPT_TEMPLATE = (
+    "Examine this photo for physical damages only. The item being inspected is: '{task_name}'.\n\n"
+    + DAMAGE_RULES +
+    "Return JSON: {{\"has_issues\": true/false, \"description\": \"short explanation\", "
+    "\"severity\": \"none/minor/moderate/severe\"}}"
+)
+# Changes whenever the prompt wording does, so edited prompts don't reuse old answers.
+PROMPT_VERSION = prompt_version(PROMPT_TEMPLATE)
+
+# Photos packed into one request (1 = one photo per request). The rules are sent once
+# per batch and each photo is labelled with its own task, so request count and prompt
+# tokens drop roughly BATCH_SIZE-fold.
+BATCH_SIZE = int(os.getenv('ANALYZER_BATCH_SIZE', '8'))
+
+BATCH_PROMPT_TEMPLATE = (
+    "Examine each of the following {count} photos for physical damages only. Every photo is preceded by "
+    "a label 'Image N: <item being inspected>'; judge each photo only against its own item.\n\n"
+    + DAMAGE_RULES +
+    "Return JSON with one entry per image, using the image's number as 'index':\n"
+    "{{\"results\": [{{\"index\": 1, \"has_issues\": true/false, \"description\": \"short explanation\", "
+    "\"severity\": \"none/minor/moderate/severe\"}}]}}"
+)
+BATCH_PROMPT_VERSION = prompt_version(BATCH_PROMPT_TEMPLATE)
+SCREEN_PROMPT_VERSION = prompt_version(PROMPT_TEMPLATE + CONFIDENCE_INSTRUCTION)
+SCREEN_BATCH_PROMPT_VERSION = prompt_version(BATCH_PROMPT_TEMPLATE + CONFIDENCE_INSTRUCTION)
+
+# Results of earlier runs, keyed on image content + model + prompt version + task,
+# so re-runs only pay for new or modified photos.
+CACHE_MAX_ENTRIES = int(os.getenv('ANALYZER_CACHE_MAX_ENTRIES', '50000'))
+RESULT_CACHE = None
+
+# Per-image and per-request stage timings, payload sizes and token usage, one JSON
+# object per line (set TELEMETRY_PROMETHEUS_FILE to also export a textfile).
+TELEMETRY = None
+
+# Burst shots: a photo whose perceptual hash is within DEDUP_DISTANCE bits (of 64) of an
+# earlier photo of the same task in the same folder reuses that photo's result, marked
+# with "inherited_from". A negative distance or ANALYZER_FORCE=1 analyzes every photo.
+DEDUP_DISTANCE = int(os.getenv('ANALYZER_DEDUP_DISTANCE', '6'))
+FORCE_ANALYSIS = os.getenv('ANALYZER_FORCE', '').lower() in ('1', 'true', 'yes')
+HASH_ALGORITHM = os.getenv('ANALYZER_HASH', 'phash')
+HASH_INDEX = None
+
+def setup():
+    """Create the output directory, client, result cache, telemetry log and hash index; idempotent."""
+    global CLIENT, RESULT_CACHE, TELEMETRY, HASH_INDEX
+    if CLIENT is not None:
+        return
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    CLIENT = create_client()
+    RESULT_CACHE = ResultCache(os.path.join(OUTPUT_DIR, 'result_cache.db'), max_entries=CACHE_MAX_ENTRIES)
+    TELEMETRY = Telemetry(os.path.join(OUTPUT_DIR, 'telemetry.jsonl'), 'inspection_analyzer')
+    HASH_INDEX = PerceptualHashIndex(os.path.join(OUTPUT_DIR, 'phash_index.db'), algorithm=HASH_ALGORITHM)
 
 def get_task_from_filename(filename):
     """
@@ -47,15 +140,50 @@ def get_task_from_filename(filename):
     
     return name.strip()
 
-def encode_image(image_path):
-    """Encode image to base64."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+def parse_response(result_text):
+    """Parse the model's JSON reply, tolerating a markdown code fence around it."""
+    if "```json" in result_text:
+        result_text = result_text.replace("```json", "").replace("```", "")
+    return json.loads(result_text)
 
-def analyze_single_image(image_path):
+def print_analysis(result):
+    has_issues = result.get("has_issues", False)
+    severity = result.get("severity", "unknown")
+    description = result.get("description", "No description")
+
+    if has_issues:
+        print(f"   🔴 ISSUE FOUND ({severity.upper()}): {description}")
+    else:
+        print(f"   🟢 OK")
+
+def make_record(image_path, task_name, analysis):
+    return {
+        "folder": os.path.basename(os.path.dirname(image_path)),
+        "filename": os.path.basename(image_path),
+        "task_derived": task_name,
+        "analysis": analysis
+    }
+
+def inherit_record(image_path, source_record):
+    """Record for a near-duplicate photo, reusing the analysis of the photo it duplicates."""
+    task_name = get_task_from_filename(os.path.basename(image_path))
+    record = make_record(image_path, task_name, dict(source_record["analysis"]))
+    record["inherited_from"] = source_record["filename"]
+    return record
+
+def tier_settings(tier):
+    """(model, prompt suffix, single prompt version, batch prompt version) for a model tier."""
+    if tier == 'screen':
+        return CASCADE.screen_model, CONFIDENCE_INSTRUCTION, SCREEN_PROMPT_VERSION, SCREEN_BATCH_PROMPT_VERSION
+    return MODEL, "", PROMPT_VERSION, BATCH_PROMPT_VERSION
+
+def analyze_single_image(image_path, data_url=None, tier='single', check_cache=True):
     """
     Send a single photo to Gemini to verify the task based on filename.
+    data_url is the photo already prepared by the pipeline, if it was; check_cache=False
+    when the caller has already missed the result cache for this photo.
     """
+    model, prompt_suffix, single_version, batch_version = tier_settings(tier)
     filename = os.path.basename(image_path)
     folder_name = os.path.basename(os.path.dirname(image_path))
     task_name = get_task_from_filename(filename)
@@ -64,94 +192,282 @@ def analyze_single_image(image_path):
     print(f"   ↳ Task: {task_name}")
 
     try:
+        image_sha = image_prep.source_sha256(image_path)
+        cached = RESULT_CACHE.get_any(image_sha, model, (single_version, batch_version), task_name) \
+            if check_cache else None
+        if cached is not None:
+            print(f"   ♻️  Cached result (unchanged photo)")
+            return make_record(image_path, task_name, cached)
+
         # Prompt construction
-        prompt_text = (
-            f"Examine this photo for physical damages only. The item being inspected is: '{task_name}'.\n\n"
-            f"STRICT REQUIREMENTS:\n"
-            f"- ONLY flag 'has_issues' as true if there is visible physical damage (cracks, breaks, dents, scratches, "
-            f"tears, stains that indicate damage, missing parts, structural issues, etc.).\n"
-            f"- Do NOT flag normal wear, minor cosmetic imperfections, or general condition issues.\n"
-            f"- Do NOT flag cleanliness, messes, or task completion status.\n"
-            f"- Be very strict: only clear, obvious physical damage should be flagged.\n"
-            f"- If there is any doubt or the damage is minimal/normal wear, mark 'has_issues' as false.\n\n"
-            f"Return JSON: {{\"has_issues\": true/false, \"description\": \"short explanation\", "
-            f"\"severity\": \"none/minor/moderate/severe\"}}"
-        )
+        prompt_text = PROMPT_TEMPLATE.format(task_name=task_name) + prompt_suffix
 
-        base64_image = encode_image(image_path)
-        
         content = [
             {"type": "text", "text": prompt_text},
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                "image_url": {"url": data_url or image_prep.image_data_url(image_path)}
             }
         ]
 
-        # Call Gemini
-        response = CLIENT.chat.completions.create(
-            model="google/gemini-2.5-flash",
+        # Call Gemini (retried on 429/5xx)
+        request_started = time.perf_counter()
+        response = EXECUTOR.call(
+            CLIENT.chat.completions.create,
+            model=model,
             messages=[{"role": "user", "content": content}],
             response_format={"type": "json_object"}
         )
 
-        result_text = response.choices[0].message.content
+        parse_started = time.perf_counter()
+        try:
+            result = parse_response(response.choices[0].message.content)
+        finally:
+            TELEMETRY.request(folder_name, 1, response, parse_started - request_started,
+                              time.perf_counter() - parse_started, filename=filename, tier=tier, model=model,
+                              payload_bytes=content_bytes(content))
+        RESULT_CACHE.put(image_sha, model, single_version, task_name, result)
+        print_analysis(result)
+        return make_record(image_path, task_name, result)
 
-        # Clean up response if markdown is present
-        if "```json" in result_text:
-            result_text = result_text.replace("```json", "").replace("```", "")
+    except Exception as e:
+        print(f"   ❌ Error analyzing image: {e}")
+        return None
 
-        result = json.loads(result_text)
+def is_cached(image_path, tier='single'):
+    """Whether analyze_batch would answer for image_path from the result cache."""
+    model, _, single_version, batch_version = tier_settings(tier)
+    try:
+        image_sha = image_prep.source_sha256(image_path)
+    except OSError:
+        return False
+    task_name = get_task_from_filename(os.path.basename(image_path))
+    return RESULT_CACHE.contains(image_sha, model, (batch_version, single_version), task_name)
 
-        # Print result to console
-        has_issues = result.get("has_issues", False)
-        severity = result.get("severity", "unknown")
-        description = result.get("description", "No description")
+def analyze_batch(image_paths, data_urls=None, tier='single'):
+    """
+    Analyze several photos in one request; returns one record (or None) per path, in
+    order. Photos whose entry is missing or malformed, or the whole batch if the reply
+    can't be parsed, are re-run one at a time with analyze_single_image. If the request
+    itself fails (after the executor's retries), the batch's photos get None.
+    """
+    model, prompt_suffix, single_version, batch_version = tier_settings(tier)
+    data_urls = data_urls or {}
+    if len(image_paths) == 1:
+        return [analyze_single_image(image_paths[0], data_urls.get(image_paths[0]), tier)]
 
-        if has_issues:
-            print(f"   🔴 ISSUE FOUND ({severity.upper()}): {description}")
+    records = [None] * len(image_paths)
+    pending = []  # (position, path, task, sha) still needing the model
+    for position, image_path in enumerate(image_paths):
+        task_name = get_task_from_filename(os.path.basename(image_path))
+        try:
+            image_sha = image_prep.source_sha256(image_path)
+        except OSError as e:
+            print(f"   ❌ Error reading {image_path}: {e}")
+            continue
+        # Photos that fell back to a single request were cached under the single prompt.
+        cached = RESULT_CACHE.get_any(image_sha, model, (batch_version, single_version), task_name)
+        if cached is not None:
+            print(f"♻️  Cached: [{os.path.basename(os.path.dirname(image_path))}] {os.path.basename(image_path)}")
+            records[position] = make_record(image_path, task_name, cached)
         else:
-            print(f"   🟢 OK")
+            pending.append((position, image_path, task_name, image_sha))
 
-        return {
-            "folder": folder_name,
-            "filename": filename,
-            "task_derived": task_name,
-            "analysis": result
-        }
+    # Prepare the photos the pipeline didn't; one that can't be read is dropped, not the batch.
+    urls = {}
+    for _, image_path, _, _ in pending:
+        try:
+            urls[image_path] = data_urls.get(image_path) or image_prep.image_data_url(image_path)
+        except OSError as e:
+            print(f"   ❌ Error reading {image_path}: {e}")
+    pending = [item for item in pending if item[1] in urls]
 
+    if not pending:
+        return records
+    if len(pending) == 1:
+        position, image_path = pending[0][:2]
+        records[position] = analyze_single_image(image_path, urls[image_path], tier, check_cache=False)
+        return records
+
+    label = f"{os.path.basename(os.path.dirname(pending[0][1]))}, {len(pending)} photos"
+    print(f"Processing batch: [{label}]")
+
+    content = [{"type": "text", "text": BATCH_PROMPT_TEMPLATE.format(count=len(pending)) + prompt_suffix}]
+    for number, (_, image_path, task_name, _) in enumerate(pending, start=1):
+        content.append({"type": "text", "text": f"Image {number}: {task_name}"})
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": urls[image_path]}
+        })
+
+    # Throttling and outages were already retried by the executor; sending the photos
+    # one by one would only repeat the failure len(pending) times.
+    try:
+        request_started = time.perf_counter()
+        response = EXECUTOR.call(
+            CLIENT.chat.completions.create,
+            model=model,
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"}
+        )
     except Exception as e:
-        print(f"   ❌ Error analyzing image: {e}")
-        return None
+        print(f"   ❌ Error analyzing batch [{label}]: {e}")
+        return records
 
-def save_result(result, output_file):
-    """Append a single result to the JSON file."""
-    if os.path.exists(output_file):
-        with open(output_file, 'r') as f:
-            try:
-                all_results = json.load(f)
-            except json.JSONDecodeError:
-                all_results = []
-    else:
-        all_results = []
+    by_index = {}
+    parse_started = time.perf_counter()
+    try:
+        entries = parse_response(response.choices[0].message.content).get("results", [])
+        for entry in entries:
+            if isinstance(entry, dict) and isinstance(entry.get("index"), int) and "has_issues" in entry:
+                by_index.setdefault(entry.pop("index"), entry)
+    except (ValueError, TypeError, AttributeError, IndexError) as e:
+        # Unparseable or wrongly shaped reply: every photo is retried on its own below.
+        print(f"   ❌ Unusable reply for batch [{label}]: {e}; retrying photos one at a time")
+    finally:
+        TELEMETRY.request(os.path.basename(os.path.dirname(pending[0][1])), len(pending), response,
+                          parse_started - request_started, time.perf_counter() - parse_started,
+                          tier=tier, model=model, payload_bytes=content_bytes(content))
+
+    retry_singly = []
+    for number, (position, image_path, task_name, image_sha) in enumerate(pending, start=1):
+        result = by_index.get(number)
+        if result is None:
+            retry_singly.append((position, image_path))
+            continue
+        RESULT_CACHE.put(image_sha, model, batch_version, task_name, result)
+        print(f"   [{os.path.basename(image_path)}] ↳ {task_name}")
+        print_analysis(result)
+        records[position] = make_record(image_path, task_name, result)
+
+    if by_index and retry_singly:
+        print(f"   ⚠️  Batch [{label}]: no usable result for {len(retry_singly)} photo(s); retrying singly")
+    for position, image_path in retry_singly:
+        records[position] = analyze_single_image(image_path, urls[image_path], tier, check_cache=False)
+    return records
 
-    all_results.append(result)
+def analyze_photos(image_paths, data_urls=None):
+    """
+    analyze_batch, through the model cascade when it is on: the screening model's
+    record stands unless CASCADE escalates it, and each record names its model.
+    """
+    if not CASCADE:
+        return analyze_batch(image_paths, data_urls)
 
-    with open(output_file, 'w') as f:
-        json.dump(all_results, f, indent=2)
+    records = analyze_batch(image_paths, data_urls, tier='screen')
+    for record in records:
+        if record:
+            record["model"] = CASCADE.screen_model
+    escalate = [position for position, record in enumerate(records)
+                if CASCADE.should_escalate(record["analysis"] if record else None)]
+    if escalate:
+        print(f"⬆️  Escalating {len(escalate)} of {len(image_paths)} photo(s) to {MODEL}")
+        confirmed = analyze_batch([image_paths[position] for position in escalate], data_urls, tier='confirm')
+        for position, record in zip(escalate, confirmed):
+            # If the second opinion fails, the screening verdict is better than none.
+            if record:
+                record["model"] = MODEL
+                records[position] = record
+    return records
+
+@contextmanager
+def log_locked(log_file):
+    """
+    Exclusive lock on the results log, shared by every process appending to it or
+    compacting it (a batch run and watch.py may both be running).
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(log_file + '.lock', 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+def save_result(result, log_file):
+    """Append a single result as one JSON line; constant cost per image and crash-safe."""
+    with log_locked(log_file), open(log_file, 'a') as f:
+        f.write(json.dumps(result) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def compact_results(log_file, output_file):
+    """
+    Rewrite the JSONL log as the indented JSON array app.py expects. A photo logged more
+    than once (re-runs and watch mode append it again) keeps its first position with
+    its latest record, and the log itself is rewritten the same way so it doesn't grow
+    with every run. Reads the log twice rather than holding the records, and swaps both
+    files in atomically, so readers never see a partial array.
+    """
+    with log_locked(log_file):
+        # First pass: offset of each photo's latest line, in first-seen order.
+        latest = {}
+        lines = 0
+        with open(log_file, 'rb') as src:
+            while True:
+                offset = src.tell()
+                line = src.readline()
+                if not line:
+                    break
+                lines += 1
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from an interrupted run
+                    continue
+                latest[(result.get('folder'), result.get('filename'))] = offset
+
+        count = 0
+        tmp_file = output_file + '.tmp'
+        tmp_log = log_file + '.tmp'
+        with open(log_file, 'rb') as src, open(tmp_file, 'w') as dst, open(tmp_log, 'wb') as log:
+            dst.write("[")
+            for offset in latest.values():
+                src.seek(offset)
+                line = src.readline()
+                log.write(line if line.endswith(b"\n") else line + b"\n")
+                item = json.dumps(json.loads(line), indent=2).replace("\n", "\n  ")
+                dst.write(("," if count else "") + "\n  " + item)
+                count += 1
+            dst.write("\n]" if count else "]")
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(tmp_file, output_file)
+        if count < lines:
+            os.replace(tmp_log, log_file)
+        else:
+            os.remove(tmp_log)
+    return count
 
 def main():
+    if missing_api_key():
+        print("Error: OPENROUTER_API_KEY not found in .env file")
+        return
+    setup()
+
     print("🔍 Starting Individual Image Analysis...\n")
     
     output_file = os.path.join(OUTPUT_DIR, 'analysis_results.json')
+    log_file = os.path.join(OUTPUT_DIR, 'analysis_results.jsonl')
     
-    # Clear previous results file if you want a fresh start, otherwise it appends
-    if os.path.exists(output_file):
-        os.remove(output_file)
+    # The log is kept: watch.py may be appending to it, and compaction keeps only each
+    # photo's latest record. Delete both files by hand for a clean slate.
 
     total_images = 0
     issues_found = 0
+    inherited = 0
+    folder_counts = {}
+    duplicates = {}
+    dedup = DEDUP_DISTANCE >= 0 and not FORCE_ANALYSIS
 
+    print(f"⚙️  Up to {MAX_IN_FLIGHT} requests in flight, {REQUESTS_PER_MINUTE:g} requests/minute max, "
+          f"{BATCH_SIZE} photo(s) per request, model "
+          + (f"{CASCADE.screen_model} -> {MODEL} (cascade)" if CASCADE else MODEL))
+
+    # Queue every folder up front so the pipeline never drains at folder boundaries.
+    work = []
     for folder in INSPECTION_FOLDERS:
         if not os.path.exists(folder):
             print(f"⚠️  Folder not found: {folder}")
@@ -161,28 +477,92 @@ def main():
         files = [f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
         files.sort() # Sort alphabetically
 
-        print(f"\n📂 Entering Folder: {folder} ({len(files)} images)")
+        print(f"\n📂 Queued Folder: {folder} ({len(files)} images)")
+        folder_counts[folder] = {"analyzed": 0, "issues": 0}
+
+        paths = [os.path.join(folder, filename) for filename in files]
+        if dedup:
+            folder_duplicates = HASH_INDEX.group_duplicates(
+                paths, DEDUP_DISTANCE, key=lambda path: get_task_from_filename(os.path.basename(path))
+            )
+            if folder_duplicates:
+                print(f"   ↳ {len(folder_duplicates)} near-duplicate photo(s) will reuse an earlier result")
+            duplicates.update(folder_duplicates)
 
-        for filename in files:
-            full_path = os.path.join(folder, filename)
-            
-            # Analyze
-            result = analyze_single_image(full_path)
-            
+        # Each unit is (folder, photos in order, photos to send, photos to prepare);
+        # duplicates ride along with their unit so results stay in folder order, but
+        # take no batch slot, and photos the result cache will answer skip preparation.
+        unit_paths, to_analyze, to_prepare = [], [], []
+        for path in paths:
+            unit_paths.append(path)
+            if path not in duplicates:
+                to_analyze.append(path)
+                if not is_cached(path, 'screen' if CASCADE else 'single'):
+                    to_prepare.append(path)
+            if len(to_analyze) >= max(1, BATCH_SIZE):
+                work.append((folder, unit_paths, to_analyze, to_prepare))
+                unit_paths, to_analyze, to_prepare = [], [], []
+        if unit_paths:
+            work.append((folder, unit_paths, to_analyze, to_prepare))
+
+    # Photos are prepared in worker processes while earlier batches are on the wire.
+    pipeline = Pipeline(
+        lambda unit, urls: analyze_photos(unit[2], urls),
+        paths_of=lambda unit: unit[3],
+        io_workers=MAX_IN_FLIGHT,
+        telemetry=TELEMETRY
+    )
+
+    # Results arrive in submission order so the results file is the same as a sequential run.
+    records = {}
+    for results, (folder, unit_paths, to_analyze, _) in zip(pipeline.run(work), work):
+        records.update(zip(to_analyze, results or []))
+        for path in unit_paths:
+            if path in duplicates:
+                source = records.get(duplicates[path])
+                if source:
+                    result = inherit_record(path, source)
+                    inherited += 1
+                else:
+                    # The photo it duplicates failed, so analyze this one after all.
+                    result = analyze_photos([path])[0]
+                records[path] = result
+            else:
+                result = records.get(path)
             if result:
-                save_result(result, output_file)
+                with TELEMETRY.timed('write', 'write', folder, filename=result['filename']):
+                    save_result(result, log_file)
                 total_images += 1
+                folder_counts[folder]["analyzed"] += 1
                 if result['analysis'].get('has_issues', False):
                     issues_found += 1
+                    folder_counts[folder]["issues"] += 1
+
+    if os.path.exists(log_file):
+        compact_results(log_file, output_file)
 
     # Summary
     print(f"\n{'='*80}")
     print(f"✅ Analysis complete! Results saved to: {output_file}")
     print(f"{'='*80}")
     print(f"📊 SUMMARY:")
+    for folder, counts in folder_counts.items():
+        print(f"   {folder}: {counts['analyzed']} analyzed, {counts['issues']} with issues")
     print(f"   Total images analyzed: {total_images}")
     print(f"   Images with issues:    {issues_found}")
     print(f"   Images passed:         {total_images - issues_found}")
+    print(f"   Inherited (near-dups): {inherited}" + ("" if dedup else " (dedup off)"))
+    if dedup:
+        print(f"   Perceptual hashes:     {HASH_INDEX.summary()}")
+    print(f"   Result cache:          {RESULT_CACHE.summary()}")
+    print(f"   API requests:          {EXECUTOR.summary()}")
+    if CASCADE:
+        print(f"   Cascade:               {CASCADE.summary()}")
+    print(f"   Pipeline:              {pipeline.summary()}")
+    TELEMETRY.close()
+    print(f"   Telemetry:             {TELEMETRY.path}")
+    for line in TELEMETRY.summary_lines():
+        print(f"      {line}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict
+
+# Appended to the screening prompt so the fast model says how sure it is.
+CONFIDENCE_INSTRUCTION = (
+    "\n\nAlso include \"confidence\": a number from 0 to 1 for how sure you are of each verdict "
+    "(1 = certain)."
+)
+
+
+def confidence_of(result: Dict) -> float:
+    """The screening model's confidence, or 0 when it gave none (so the photo escalates)."""
+    try:
+        return min(1.0, max(0.0, float(result.get("confidence", 0.0))))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Cascade:
+    """
+    Two-tier classification: a fast model screens every photo, and only positives, or
+    verdicts below `min_confidence`, go on to the expensive model. Counts how many
+    photos each tier settled. Thread-safe.
+    """
+
+    def __init__(self, screen_model: str, confirm_model: str, min_confidence: float, flag: str):
+        self.screen_model = screen_model
+        self.confirm_model = confirm_model
+        self.min_confidence = min_confidence
+        self.flag = flag
+        self._lock = threading.Lock()
+        self.counts = {'screened': 0, 'escalated': 0, 'positive': 0, 'low_confidence': 0, 'failed': 0}
+
+    def should_escalate(self, result) -> bool:
+        """Whether a screening result (None if screening failed) needs the expensive model."""
+        with self._lock:
+            self.counts['screened'] += 1
+            if result is None:
+                reason = 'failed'
+            elif result.get(self.flag):
+                reason = 'positive'
+            elif confidence_of(result) < self.min_confidence:
+                reason = 'low_confidence'
+            else:
+                return False
+            self.counts[reason] += 1
+            self.counts['escalated'] += 1
+            return True
+
+    def summary(self) -> str:
+        with self._lock:
+            counts = dict(self.counts)
+        rate = counts['escalated'] / counts['screened'] * 100 if counts['screened'] else 0.0
+        return (
+            f"{counts['screened']} screened by {self.screen_model}, {counts['escalated']} escalated "
+            f"to {self.confirm_model} ({rate:.0f}%: {counts['positive']} positive, "
+            f"{counts['low_confidence']} below {self.min_confidence:g} confidence, {counts['failed']} failed)"
+        )
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+import image_prep
+
+HASH_SIZE = 8  # 8x8 bits -> 64-bit hashes
+ALGORITHMS = ('phash', 'dhash')
+
+# Orthonormal DCT-II basis for the 32x32 pHash input, built once.
+_DCT_N = 32
+_DCT = np.sqrt(2.0 / _DCT_N) * np.cos(
+    np.pi * (2 * np.arange(_DCT_N)[None, :] + 1) * np.arange(_DCT_N)[:, None] / (2 * _DCT_N)
+)
+_DCT[0] /= np.sqrt(2.0)
+
+
+def _grayscale(path, width, height) -> np.ndarray:
+    # Draft-mode decode keeps this cheap: we only need a few dozen pixels.
+    img = image_prep.open_oriented(path, 4 * max(width, height)).convert('L')
+    img = img.resize((width, height), image_prep.Image.LANCZOS)
+    return np.asarray(img, dtype=np.float64)
+
+
+def _to_int(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.astype(np.uint8).ravel()).view('>u8')[0])
+
+
+def dhash(path) -> int:
+    """Difference hash: is each pixel brighter than its right-hand neighbour?"""
+    pixels = _grayscale(path, HASH_SIZE + 1, HASH_SIZE)
+    return _to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(path) -> int:
+    """DCT hash: low-frequency coefficients above or below their median."""
+    pixels = _grayscale(path, _DCT_N, _DCT_N)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only encodes overall brightness, so keep it out of the median.
+    return _to_int(low > np.median(low[1:]))
+
+
+def hamming(a: int, b: np.ndarray) -> np.ndarray:
+    """Bit distance from hash a to every hash in b (a uint64 array)."""
+    xor = np.bitwise_xor(b, np.uint64(a))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PerceptualHashIndex:
+    """
+    Perceptual hashes of photos, persisted in SQLite keyed on the file's SHA-256, so
+    each run only hashes photos it hasn't seen. Thread-safe.
+    """
+
+    def __init__(self, path, algorithm: str = 'phash'):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm {algorithm!r}; expected one of {ALGORITHMS}")
+        self.algorithm = algorithm
+        self.computed = 0
+        self.reused = 0
+        self._hash = phash if algorithm == 'phash' else dhash
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS hashes (
+                    image_sha TEXT NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (image_sha, algorithm)
+                )
+                """
+            )
+
+    def hash_for(self, path) -> Optional[int]:
+        """The photo's hash, computing and storing it if new; None if it can't be decoded."""
+        image_sha = image_prep.source_sha256(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM hashes WHERE image_sha = ? AND algorithm = ?", (image_sha, self.algorithm)
+            ).fetchone()
+        if row is not None:
+            self.reused += 1
+            return int(row[0], 16)
+        try:
+            value = self._hash(path)
+        except Exception as e:
+            print(f"   ⚠️  Could not hash {path}: {e}")
+            return None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (image_sha, algorithm, hash) VALUES (?, ?, ?)",
+                (image_sha, self.algorithm, f"{value:016x}"),
+            )
+        self.computed += 1
+        return value
+
+    def group_duplicates(self, paths, max_distance: int, key=None) -> Dict[str, str]:
+        """
+        Map each near-duplicate in paths to the earlier photo it duplicates. Photos are
+        taken in order; one within max_distance bits of an earlier representative with
+        the same key(path) becomes its duplicate, otherwise it is a new representative.
+        """
+        duplicates = {}
+        representatives = {}  # key -> (paths, hashes)
+        for path in paths:
+            value = self.hash_for(path)
+            if value is None:
+                continue
+            group_paths, group_hashes = representatives.setdefault(key(path) if key else None, ([], []))
+            if group_hashes:
+                distances = hamming(value, np.array(group_hashes, dtype=np.uint64))
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= max_distance:
+                    duplicates[path] = group_paths[nearest]
+                    continue
+            group_paths.append(path)
+            group_hashes.append(value)
+        return duplicates
+
+    def summary(self) -> str:
+        return f"{self.computed} hashed, {self.reused} from index ({self.algorithm})"
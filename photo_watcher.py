@@ -0,0 +1,191 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+def _load_inotify():
+    """libc with the inotify calls, or None where there is no inotify (macOS, Windows)."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch') else None
+
+
+def signature(path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PhotoWatcher:
+    """
+    New or changed photos under `folders`, each reported once its writes have settled.
+    Uses inotify on Linux (no extra dependency) and falls back to polling with
+    os.scandir elsewhere. A photo is ready when no event has touched it for `debounce`
+    seconds and its size and mtime have stopped changing; the same content is never
+    reported twice. Photos present at start count as seen unless catch_up is set.
+    """
+
+    def __init__(self, folders: List[str], recursive: bool = True, debounce: float = 2.0,
+                 poll_interval: float = 2.0, use_inotify: Optional[bool] = None, catch_up: bool = False):
+        self.folders = list(folders)
+        self.recursive = recursive
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._pending: Dict[str, Tuple[float, Optional[Tuple[int, int]]]] = {}
+        self._watches: Dict[int, str] = {}
+        self._watched_dirs = set()
+        self._last_scan = 0.0
+        self._fd = None
+        self._libc = _load_inotify() if use_inotify is not False else None
+        if self._libc:
+            fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+        self.backend = 'inotify' if self._fd is not None else 'polling'
+
+        for path, sig in self._scan():
+            if catch_up:
+                self._pending[path] = (0.0, sig)
+            else:
+                self._seen[path] = sig
+        self._last_scan = time.monotonic()
+
+    def _is_image(self, name: str) -> bool:
+        return name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('.')
+
+    def _add_watch(self, directory: str) -> None:
+        if self._fd is None or directory in self._watched_dirs:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+            self._watched_dirs.add(directory)
+
+    def _scan(self, roots: Optional[List[str]] = None) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        """(path, signature) of every photo under roots; also (re)adds inotify watches."""
+        stack = [root for root in reversed(roots or self.folders) if os.path.isdir(root)]
+        while stack:
+            directory = stack.pop()
+            self._add_watch(directory)
+            subdirectories = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                subdirectories.append(entry.path)
+                        elif self._is_image(entry.name):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+                            yield entry.path, (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+            stack.extend(reversed(subdirectories))
+
+    def _touch(self, path: str, now: float) -> None:
+        self._pending[path] = (now, signature(path))
+
+    def _rescan(self, now: float, roots: Optional[List[str]] = None) -> None:
+        for path, sig in self._scan(roots):
+            if self._seen.get(path) != sig and self._pending.get(path, (0, None))[1] != sig:
+                self._pending[path] = (now, sig)
+
+    def _read_events(self, timeout: float) -> None:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return
+        now = time.monotonic()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; find out what changed the slow way.
+                self._rescan(now)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Photos can land before the new folder's watch exists.
+                    self._rescan(now, [path])
+            elif self._is_image(os.path.basename(path)):
+                self._touch(path, now)
+
+    def poll(self, timeout: float = 1.0) -> List[str]:
+        """Wait up to timeout for changes; return the photos that have settled since the last call."""
+        now = time.monotonic()
+        if self._pending:
+            # Wake up in time for the next photo to settle.
+            next_due = min(touched for touched, _ in self._pending.values()) + self.debounce
+            timeout = min(timeout, max(0.05, next_due - now))
+        if self._fd is not None:
+            self._read_events(timeout)
+            # Folders created after start (e.g. a new inspection) get picked up here.
+            if now - self._last_scan >= max(self.poll_interval, 30.0):
+                self._last_scan = now
+                for root in self.folders:
+                    if root not in self._watched_dirs:
+                        self._rescan(now, [root])
+        else:
+            if now - self._last_scan >= self.poll_interval:
+                self._last_scan = now
+                self._rescan(now)
+            time.sleep(min(timeout, self.poll_interval))
+
+        now = time.monotonic()
+        ready = []
+        for path, (touched, sig) in list(self._pending.items()):
+            if now - touched < self.debounce:
+                continue
+            current = signature(path)
+            if current is None:
+                # Deleted, or renamed away, before it settled
+                del self._pending[path]
+            elif current != sig:
+                # Still being written
+                self._pending[path] = (now, current)
+            else:
+                del self._pending[path]
+                if self._seen.get(path) != current:
+                    self._seen[path] = current
+                    ready.append(path)
+        return sorted(ready)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
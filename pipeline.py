@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import image_prep
+
+PREP_WORKERS = int(os.getenv('PIPELINE_PREP_WORKERS', str(os.cpu_count() or 1)))
+# Prepared work units allowed to wait for the I/O stage; bounds memory for payloads.
+QUEUE_DEPTH = int(os.getenv('PIPELINE_QUEUE_DEPTH', '16'))
+
+_STOP = object()
+
+
+def prepare_urls(paths, settings):
+    """
+    Runs in a prep process: (data URLs by path, per-photo stage timings by path,
+    seconds spent). A photo that can't be prepared maps to None so one bad file
+    doesn't sink its whole work unit.
+    """
+    started = time.perf_counter()
+    urls = {}
+    timings = {}
+    for path in paths:
+        timings[path] = {}
+        try:
+            urls[path] = image_prep.image_data_url(path, timings=timings[path], **settings)
+        except Exception as e:
+            print(f"Error encoding {path}: {e}")
+            urls[path] = None
+            timings[path]['error'] = str(e)
+    return urls, timings, time.perf_counter() - started
+
+
+def _process_context():
+    # Forking a process that is already running threads can deadlock the child, so
+    # start prep processes from a clean server that has only image_prep loaded.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['image_prep'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class Pipeline:
+    """
+    Two-stage pipeline for the analysis scripts. A process pool decodes, resizes and
+    encodes each work unit's photos ahead of time (CPU-bound, outside the GIL); up to
+    `depth` units wait in a bounded queue; `io_workers` threads call
+    `handle(item, urls)` so requests stay in flight while the next payloads are built.
+
+    Besides results, it tracks how long each stage was busy, how long I/O threads
+    waited on prep, and how many prepared payloads sat waiting for a free I/O thread,
+    so summary() can say which stage is the bottleneck. With a Telemetry, each
+    photo's read/decode/encode timings are recorded as an "image" event, and each
+    unit with photos to send gets a "unit" event whose latency_s runs from submission
+    to prep until handle() returns (prep, queueing, rate limiting and retries included).
+    """
+
+    def __init__(self, handle, paths_of, io_workers: int, prep_workers: int = PREP_WORKERS,
+                 depth: int = QUEUE_DEPTH, telemetry=None, **image_settings):
+        self.handle = handle
+        self.telemetry = telemetry
+        self.paths_of = paths_of
+        self.io_workers = max(1, io_workers)
+        self.prep_workers = max(1, prep_workers)
+        self.depth = max(1, depth)
+        self.image_settings = image_settings
+        self.stats = {
+            'units': 0,
+            'prep_busy': 0.0,      # seconds summed over prep processes
+            'io_busy': 0.0,        # seconds summed over I/O threads
+            'io_starved': 0.0,     # I/O threads waiting for a prepared unit
+            'feeder_blocked': 0.0, # queue of submitted units full
+            # Prepared units not yet picked up by an I/O thread, sampled whenever a unit
+            # finishes prep or is picked up.
+            'ready_samples': 0,
+            'ready_total': 0,
+            'ready_max': 0,
+            'wall': 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def run(self, items):
+        """Yield handle()'s result for each item, in item order, as soon as it's ready."""
+        started = time.perf_counter()
+        work = queue.Queue(maxsize=self.depth)
+        results = {}
+        done = threading.Condition()
+        total = [None]  # set by the feeder once items is exhausted
+        ready = set()   # indexes of prepared units no I/O thread has picked up yet
+        taken = set()
+
+        def prepared(index):
+            with self._lock:
+                if index not in taken:
+                    ready.add(index)
+                    self._sample_ready(len(ready))
+
+        with ProcessPoolExecutor(max_workers=self.prep_workers, mp_context=_process_context()) as pool:
+
+            def feed():
+                count = 0
+                try:
+                    for item in items:
+                        # A unit with nothing to prepare (e.g. all cached) skips the pool.
+                        paths = list(self.paths_of(item))
+                        submitted = time.perf_counter()
+                        future = pool.submit(prepare_urls, paths, self.image_settings) if paths else None
+                        if future is None:
+                            prepared(count)
+                        else:
+                            future.add_done_callback(lambda _, index=count: prepared(index))
+                        waited = time.perf_counter()
+                        work.put((count, item, future, paths, submitted))
+                        self._add('feeder_blocked', time.perf_counter() - waited)
+                        count += 1
+                finally:
+                    with done:
+                        total[0] = count
+                        done.notify_all()
+                    for _ in range(self.io_workers):
+                        work.put(_STOP)
+
+            def consume():
+                while True:
+                    waited = time.perf_counter()
+                    entry = work.get()
+                    if entry is _STOP:
+                        return
+                    index, item, future, paths, submitted = entry
+                    with self._lock:
+                        taken.add(index)
+                        if index in ready:
+                            ready.discard(index)
+                            self._sample_ready(len(ready))
+                    try:
+                        urls, timings, prep_seconds = future.result() if future else ({}, {}, 0.0)
+                    except Exception as e:
+                        print(f"Error preparing work unit: {e}")
+                        urls, timings, prep_seconds = {}, {}, 0.0
+                    self._add('io_starved', time.perf_counter() - waited)
+                    self._add('prep_busy', prep_seconds)
+                    if self.telemetry:
+                        for path, timing in timings.items():
+                            folder = os.path.basename(os.path.dirname(path))
+                            self.telemetry.record('image', folder, path=path,
+                                                  **{key: round(value, 4) if isinstance(value, float) else value
+                                                     for key, value in timing.items()})
+
+                    busy = time.perf_counter()
+                    try:
+                        result = self.handle(item, urls)
+                    except Exception as e:
+                        print(f"Error handling work unit: {e}")
+                        result = None
+                    finished = time.perf_counter()
+                    self._add('io_busy', finished - busy)
+                    if self.telemetry and paths:
+                        self.telemetry.record('unit', os.path.basename(os.path.dirname(paths[0])),
+                                              images=len(paths), latency_s=round(finished - submitted, 4))
+                    with done:
+                        results[index] = result
+                        done.notify_all()
+
+            threads = [threading.Thread(target=feed, daemon=True)]
+            threads += [threading.Thread(target=consume, daemon=True) for _ in range(self.io_workers)]
+            for thread in threads:
+                thread.start()
+
+            index = 0
+            wall_before = self.stats['wall']
+            while True:
+                with done:
+                    while index not in results and (total[0] is None or index < total[0]):
+                        done.wait()
+                    if index not in results:
+                        break
+                    result = results.pop(index)
+                index += 1
+                with self._lock:
+                    self.stats['units'] += 1
+                    self.stats['wall'] = wall_before + time.perf_counter() - started
+                yield result
+
+            for thread in threads:
+                thread.join()
+
+    def _add(self, key, seconds):
+        with self._lock:
+            self.stats[key] += seconds
+
+    def _sample_ready(self, count):
+        # Called with self._lock held.
+        self.stats['ready_samples'] += 1
+        self.stats['ready_total'] += count
+        self.stats['ready_max'] = max(self.stats['ready_max'], count)
+
+    def summary(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+        wall = stats['wall'] or 1e-9
+        prep_util = stats['prep_busy'] / (wall * self.prep_workers) * 100
+        io_util = stats['io_busy'] / (wall * self.io_workers) * 100
+        avg_ready = stats['ready_total'] / stats['ready_samples'] if stats['ready_samples'] else 0.0
+        starved = stats['io_starved'] / (wall * self.io_workers)
+        # Payloads routinely waiting for a free I/O thread mean the network (or rate
+        # limit) is the limit; I/O threads waiting on prep mean prep can't keep up.
+        if avg_ready >= 1:
+            bottleneck = 'io'
+        elif starved > 0.1:
+            bottleneck = 'prep'
+        else:
+            bottleneck = 'neither'
+        return (
+            f"{stats['units']} units in {stats['wall']:.1f}s; "
+            f"prep {self.prep_workers} proc {prep_util:.0f}% busy, "
+            f"io {self.io_workers} threads {io_util:.0f}% busy; "
+            f"prepared units waiting for io avg {avg_ready:.1f}, max {stats['ready_max']}; "
+            f"io waited {stats['io_starved']:.1f}s on prep ({starved * 100:.0f}%) "
+            f"-> bottleneck: {bottleneck}"
+        )
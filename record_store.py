@@ -0,0 +1,566 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from change_journal import ChangeJournal, apply_entries
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_SQLITE_FILE = BASE_DIR / "inspection_data.db"
+
+# Columns pulled out of the record blob so the dashboard filters can use an index.
+INDEXED_FIELDS = ("folder", "status", "severity")
+
+# Stay under SQLite's default host-parameter limit when building IN (...) lists.
+SQLITE_MAX_PARAMS = 500
+
+# Journal entries accumulated before the JSON file is rewritten and snapshotted.
+SNAPSHOT_EVERY = 200
+
+
+def load_json(path: Path):
+    with path.open("r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def write_json(path: Path, payload) -> None:
+    """Write via a temp file swapped in atomically, so a crash never leaves a truncated file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        json.dump(payload, handle, indent=2)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_journaled(path: Path, journal: ChangeJournal) -> List[Dict]:
+    """The data file with the journal entries not yet folded into it replayed on top."""
+    records = load_json(path)
+    apply_entries(records, journal.entries(after_seq=journal.checkpoint()))
+    return records
+
+
+def matches(item: Dict, criteria: Dict) -> bool:
+    return all(item.get(field) == value for field, value in criteria.items())
+
+
+class RecordStore(ABC):
+    """
+    Storage interface for dashboard records. Every record is a dict keyed by its "id"
+    (folder/filename); backends must preserve insertion order in all().
+    """
+
+    @abstractmethod
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def all(self) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, item_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def page(self, criteria: Dict, limit: Optional[int] = None, after: Optional[int] = None):
+        """
+        Records whose fields equal every value in criteria, in store order, as
+        (items, next_cursor). Cursors are store positions: pass next_cursor back as
+        `after` to continue; it is None once the last match has been returned.
+        """
+        raise NotImplementedError
+
+    def find(self, criteria: Dict) -> List[Dict]:
+        return self.page(criteria)[0]
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Number of records per status."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_many(self, patches: Dict[str, Dict]) -> List[Dict]:
+        """
+        Apply {item_id: updates} in a single write and return the updated records.
+        Raises KeyError (with the list of unknown ids) before writing anything if any id is missing.
+        """
+        raise NotImplementedError
+
+    def update(self, item_id: str, updates: Dict) -> Optional[Dict]:
+        """Apply updates to one record and return it, or None if the id is unknown."""
+        try:
+            return self.update_many({item_id: updates})[0]
+        except KeyError:
+            return None
+
+    @abstractmethod
+    def replace_all(self, records: List[Dict]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_many(self, records: List[Dict], keep_fields) -> Dict[str, int]:
+        """
+        Insert unknown records and refresh known ones, leaving keep_fields (reviewer
+        edits) untouched on records that already exist. Returns counts of
+        "added", "updated" and "unchanged" records. Call flush() when done.
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist anything held only in memory; a no-op for write-through backends."""
+
+    @abstractmethod
+    def version(self) -> int:
+        """Dataset version; strictly increases with every write."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def changes_since(self, since: int):
+        """
+        Records modified after version `since`, as (items, version, reset). When reset
+        is True the caller is too far behind (e.g. the data was re-imported) and must
+        reload everything instead; items is then empty.
+        """
+        raise NotImplementedError
+
+
+class JsonRecordStore(RecordStore):
+    """
+    The original layout: one indented JSON array.
+
+    Parsed records are cached in-process together with an id index. The file is only
+    re-read when its mtime or size changes (e.g. edited by hand or by another
+    process); writes update the cache first, so reads after a write never re-parse.
+
+    Edits are appended to a ChangeJournal in backup_dir instead of rewriting the file.
+    Every SNAPSHOT_EVERY entries the file is rewritten and a snapshot is taken; on
+    load, journal entries newer than the last checkpoint are replayed on top. The
+    journal seq doubles as the dataset version for the change feed.
+
+    Several processes may share the files (the dashboard and `flask ingest`): every
+    operation holds the journal's file lock and first catches up on journal lines
+    the others appended, so seqs never collide and no one compacts stale records.
+    """
+
+    def __init__(self, path: Path, backup_dir: Path, snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.backup_dir = backup_dir
+        self.snapshot_every = snapshot_every
+        self.journal = ChangeJournal(backup_dir)
+        self._lock = threading.RLock()
+        self._records: List[Dict] = []
+        self._index: Dict[str, Dict] = {}
+        self._stamp = None
+        self._journal_stamp = None
+        self._checkpoint = self.journal.checkpoint()
+        self._versions: Dict[str, int] = {}
+        # Entries up to the checkpoint are archived; feed readers older than that reload.
+        self._reset_version = self._checkpoint
+        self._dirty = False
+        for entry in self.journal.entries():
+            self._note(entry)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def all(self) -> List[Dict]:
+        with self._locked():
+            return list(self._records)
+
+    def get(self, item_id: str) -> Optional[Dict]:
+        with self._locked():
+            return self._index.get(item_id)
+
+    def page(self, criteria: Dict, limit: Optional[int] = None, after: Optional[int] = None):
+        with self._locked():
+            items, last_position = [], None
+            start = 0 if after is None else after + 1
+            for position in range(start, len(self._records)):
+                item = self._records[position]
+                if not matches(item, criteria):
+                    continue
+                if limit is not None and len(items) == limit:
+                    # Another match exists past this page.
+                    return items, last_position
+                items.append(item)
+                last_position = position
+            return items, None
+
+    def counts(self) -> Dict[str, int]:
+        with self._locked():
+            return dict(Counter(item.get("status") for item in self._records))
+
+    def update_many(self, patches: Dict[str, Dict]) -> List[Dict]:
+        with self._locked():
+            missing = [item_id for item_id in patches if item_id not in self._index]
+            if missing:
+                raise KeyError(missing)
+            batch = []
+            for item_id, updates in patches.items():
+                item = self._index[item_id]
+                changes = {k: v for k, v in updates.items() if item.get(k) != v}
+                if changes:
+                    batch.append((item_id, {k: item.get(k) for k in changes}, changes))
+                    item.update(changes)
+            for entry in self.journal.record(batch):
+                self._note(entry)
+            if self.journal.pending() >= self.snapshot_every:
+                self.compact()
+            return [self._index[item_id] for item_id in patches]
+
+    def replace_all(self, records: List[Dict]) -> None:
+        with self._locked():
+            self._set_records(records)
+            self._mark_reset()
+            self.compact()
+
+    def upsert_many(self, records: List[Dict], keep_fields) -> Dict[str, int]:
+        counts = {"added": 0, "updated": 0, "unchanged": 0}
+        with self._locked():
+            batch = []
+            # Last occurrence wins if the input repeats an id.
+            for record in {record["id"]: record for record in records}.values():
+                item = self._index.get(record["id"])
+                if item is None:
+                    # New records can't be journaled as field edits; flush() rewrites the file.
+                    self._records.append(record)
+                    self._index[record["id"]] = record
+                    self._dirty = True
+                    counts["added"] += 1
+                    continue
+                changes = {k: v for k, v in record.items() if k not in keep_fields and item.get(k) != v}
+                if changes:
+                    batch.append((record["id"], {k: item.get(k) for k in changes}, changes))
+                    item.update(changes)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+            for entry in self.journal.record(batch):
+                self._note(entry)
+        return counts
+
+    def flush(self) -> None:
+        with self._locked():
+            if self._dirty:
+                self._mark_reset()
+                self.compact()
+                self._dirty = False
+
+    def version(self) -> int:
+        with self._locked():
+            return self.journal.seq
+
+    def changes_since(self, since: int):
+        with self._locked():
+            version = self.journal.seq
+            if since < self._reset_version or since > version:
+                return [], version, True
+            changed = sorted((seq, item_id) for item_id, seq in self._versions.items() if seq > since)
+            return [self._index[item_id] for _, item_id in changed if item_id in self._index], version, False
+
+    def compact(self) -> None:
+        """Fold pending journal entries into the data file and take a snapshot."""
+        with self._lock, self.journal.locked():
+            write_json(self.path, self._records)
+            self._stamp = self._file_stamp()
+            self.journal.snapshot(self._records)
+            self._checkpoint = self.journal.checkpoint()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store across threads and processes, caught up with everyone's writes."""
+        with self._lock, self.journal.locked():
+            self._refresh()
+            yield
+            # Nobody else can have written meanwhile, so this stamp covers only our own writes.
+            self._journal_stamp = self.journal.stamp()
+
+    def _file_stamp(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        stamp = self._file_stamp()
+        if stamp == self._stamp and self.journal.stamp() == self._journal_stamp:
+            return
+        # Lines other processes appended (or archived by compacting) since we last looked.
+        entries = self.journal.catch_up()
+        for entry in entries:
+            self._note(entry)
+        if stamp is None or stamp == self._stamp:
+            # Not written yet (first ingest), or only the journal moved.
+            if entries:
+                apply_entries(self._records, entries)
+            return
+
+        checkpoint = self.journal.checkpoint()
+        previous = self._records
+        self._set_records(load_journaled(self.path, self.journal))
+        if self._dirty:
+            # Records this process added but hasn't flushed yet aren't in the file.
+            for record in previous:
+                if record.get("id") not in self._index:
+                    self._records.append(record)
+                    self._index[record.get("id")] = record
+        if self._stamp is not None and checkpoint == self._checkpoint:
+            # Edited outside any store (not a compaction): we can no longer say which records changed.
+            self._mark_reset()
+        self._stamp = stamp
+        self._checkpoint = checkpoint
+        if not self.journal.snapshots():
+            # Baseline so point-in-time restore covers everything from here on.
+            self.compact()
+
+    def _note(self, entry: Dict) -> None:
+        """Track the seq that last touched each record, for changes_since()."""
+        if entry.get("reset"):
+            self._reset_version = entry["seq"]
+            self._versions.clear()
+        else:
+            self._versions[entry["id"]] = entry["seq"]
+
+    def _set_records(self, records: List[Dict]) -> None:
+        self._records = records
+        self._index = {item.get("id"): item for item in records}
+
+    def _mark_reset(self) -> None:
+        self._reset_version = self.journal.mark_reset()
+        self._versions.clear()
+
+
+class SqliteRecordStore(RecordStore):
+    """
+    One row per record in a WAL-mode SQLite file. The full record lives in a JSON
+    column; id is the primary key and folder/status/severity are indexed copies.
+    Each row carries the dataset version that last wrote it; the current and last
+    reset versions live in the meta table.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    folder TEXT,
+                    status TEXT,
+                    severity TEXT,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+            if "version" not in columns:
+                # Databases imported before the change feed existed.
+                self._conn.execute("ALTER TABLE records ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('reset_version', 0)")
+            for field in INDEXED_FIELDS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_records_{field} ON records ({field})")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_position ON records (position)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_version ON records (version)")
+
+    def exists(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM records LIMIT 1").fetchone()
+        return row is not None
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM records ORDER BY position").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, item_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM records WHERE id = ?", (item_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def page(self, criteria: Dict, limit: Optional[int] = None, after: Optional[int] = None):
+        clauses, params = [], []
+        for field, value in criteria.items():
+            if field in INDEXED_FIELDS:
+                clauses.append(f"{field} = ?")
+            else:
+                clauses.append("json_extract(data, ?) = ?")
+                params.append(f'$."{field}"')
+            params.append(int(value) if isinstance(value, bool) else value)
+        if after is not None:
+            clauses.append("position > ?")
+            params.append(after)
+        sql = f"SELECT position, data FROM records WHERE {' AND '.join(clauses) or '1'} ORDER BY position"
+        if limit is not None:
+            # One extra row tells us whether another page exists.
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+        return [json.loads(data) for _, data in rows], next_cursor
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM records GROUP BY status").fetchall()
+        return dict(rows)
+
+    def update_many(self, patches: Dict[str, Dict]) -> List[Dict]:
+        ids = list(patches)
+        with self._lock, self._conn:
+            found = {}
+            for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+                chunk = ids[start:start + SQLITE_MAX_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                for item_id, data in self._conn.execute(
+                    f"SELECT id, data FROM records WHERE id IN ({placeholders})", chunk
+                ):
+                    found[item_id] = json.loads(data)
+            missing = [item_id for item_id in ids if item_id not in found]
+            if missing:
+                raise KeyError(missing)
+            for item_id, updates in patches.items():
+                found[item_id].update(updates)
+            version = self._bump_version()
+            self._conn.executemany(
+                "UPDATE records SET folder = ?, status = ?, severity = ?, data = ?, version = ? WHERE id = ?",
+                [
+                    (*self._index_values(found[item_id]), json.dumps(found[item_id]), version, item_id)
+                    for item_id in ids
+                ],
+            )
+        return [found[item_id] for item_id in ids]
+
+    def replace_all(self, records: List[Dict]) -> None:
+        with self._lock, self._conn:
+            version = self._bump_version()
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'reset_version'", (version,))
+            self._conn.execute("DELETE FROM records")
+            self._conn.executemany(
+                "INSERT INTO records (id, position, folder, status, severity, data, version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (item["id"], position, *self._index_values(item), json.dumps(item), version)
+                    for position, item in enumerate(records)
+                ],
+            )
+
+    def upsert_many(self, records: List[Dict], keep_fields) -> Dict[str, int]:
+        counts = {"added": 0, "updated": 0, "unchanged": 0}
+        # Last occurrence wins if the input repeats an id.
+        incoming = {record["id"]: record for record in records}
+        ids = list(incoming)
+        with self._lock, self._conn:
+            existing = {}
+            for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+                chunk = ids[start:start + SQLITE_MAX_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                for item_id, data in self._conn.execute(
+                    f"SELECT id, data FROM records WHERE id IN ({placeholders})", chunk
+                ):
+                    existing[item_id] = json.loads(data)
+
+            inserts, updates = [], []
+            for item_id, record in incoming.items():
+                item = existing.get(item_id)
+                if item is None:
+                    inserts.append(record)
+                    continue
+                changes = {k: v for k, v in record.items() if k not in keep_fields and item.get(k) != v}
+                if changes:
+                    item.update(changes)
+                    updates.append(item)
+                else:
+                    counts["unchanged"] += 1
+            if not inserts and not updates:
+                return counts
+
+            version = self._bump_version()
+            next_position = self._conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM records").fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO records (id, position, folder, status, severity, data, version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (item["id"], next_position + offset, *self._index_values(item), json.dumps(item), version)
+                    for offset, item in enumerate(inserts)
+                ],
+            )
+            self._conn.executemany(
+                "UPDATE records SET folder = ?, status = ?, severity = ?, data = ?, version = ? WHERE id = ?",
+                [(*self._index_values(item), json.dumps(item), version, item["id"]) for item in updates],
+            )
+        counts["added"] = len(inserts)
+        counts["updated"] = len(updates)
+        return counts
+
+    def version(self) -> int:
+        with self._lock:
+            return self._meta("version")
+
+    def changes_since(self, since: int):
+        with self._lock:
+            version = self._meta("version")
+            if since < self._meta("reset_version") or since > version:
+                return [], version, True
+            rows = self._conn.execute(
+                "SELECT data FROM records WHERE version > ? ORDER BY version, position", (since,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], version, False
+
+    def _meta(self, key: str) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _bump_version(self) -> int:
+        """Must be called inside the write transaction."""
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        return self._meta("version")
+
+    @staticmethod
+    def _index_values(item: Dict):
+        return tuple(item.get(field) for field in INDEXED_FIELDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-shot import of inspection records into SQLite.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-json", type=Path, help="Existing dashboard data file (keeps review state)")
+    source.add_argument("--from-analysis", type=Path, help="Raw analysis_results.json (all records start pending)")
+    parser.add_argument("--journal-dir", type=Path,
+                        help="Edit journal of --from-json (default: backups/ next to it)")
+    parser.add_argument("--db", type=Path, default=DEFAULT_SQLITE_FILE, help="Target SQLite file")
+    args = parser.parse_args()
+
+    if args.from_json:
+        # The file can lag the journal by up to SNAPSHOT_EVERY edits; replay them.
+        journal = ChangeJournal(args.journal_dir or args.from_json.parent / "backups")
+        records = load_journaled(args.from_json, journal)
+    else:
+        # Imported lazily: app.py builds its store from this module.
+        from app import transform_ai_results
+
+        records = transform_ai_results(load_json(args.from_analysis))
+
+    store = SqliteRecordStore(args.db)
+    store.replace_all(records)
+    print(f"Imported {len(records)} records into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from openai import APIConnectionError
+
+from rate_limiter import RateLimiter
+
+
+def status_code_of(exc) -> Optional[int]:
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status
+
+
+def retry_after_of(exc) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After / retry-after-ms headers."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Neither seconds nor an HTTP date: ignore it and fall back to our own backoff.
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def is_retryable(exc) -> bool:
+    status = status_code_of(exc)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    # APITimeoutError subclasses APIConnectionError
+    return isinstance(exc, (APIConnectionError, ConnectionError, TimeoutError))
+
+
+class RequestExecutor:
+    """
+    Runs API calls with retries and an adaptive concurrency limit.
+
+    429s and 5xx/connection errors are retried up to max_retries times, waiting
+    Retry-After when the provider sends it and jittered exponential backoff
+    otherwise. Concurrency follows AIMD: every `limit` consecutive successes raise
+    the limit by one (up to max_concurrency); a 429 halves it (at most once per
+    backoff period, so a burst of 429s from one overload counts once). Callers may
+    run more threads than the limit; extra threads wait for a slot.
+    """
+
+    def __init__(self, max_concurrency: int, initial_concurrency: Optional[int] = None,
+                 min_concurrency: int = 1, max_retries: int = 5, base_delay: float = 1.0,
+                 max_delay: float = 60.0, rate_limiter: Optional[RateLimiter] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = min(self.max_concurrency, max(self.min_concurrency, initial_concurrency or self.max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+        self.counters = {
+            'requests': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'throttles': 0,
+            'server_errors': 0,
+            'peak_in_flight': 0,
+        }
+        self.in_flight = 0
+        self._successes_at_limit = 0
+        self._next_decrease_at = 0.0
+        self._cond = threading.Condition()
+
+    def call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            # Wait for the rate token before taking a slot, so a thread held back by the
+            # rate limit doesn't sit on a slot another request could be using.
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            self._acquire_slot()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                self._release_slot()
+                retryable = is_retryable(exc)
+                delay = self._on_error(exc, attempt) if retryable else None
+                if not retryable or attempt >= self.max_retries:
+                    with self._cond:
+                        self.counters['failures'] += 1
+                    raise
+                attempt += 1
+                with self._cond:
+                    self.counters['retries'] += 1
+                time.sleep(delay)
+                continue
+            self._release_slot()
+            self._on_success()
+            return result
+
+    def _acquire_slot(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            self.counters['requests'] += 1
+            self.counters['peak_in_flight'] = max(self.counters['peak_in_flight'], self.in_flight)
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def _on_success(self) -> None:
+        with self._cond:
+            self.counters['successes'] += 1
+            self._successes_at_limit += 1
+            if self._successes_at_limit >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes_at_limit = 0
+                self._cond.notify()
+
+    def _on_error(self, exc, attempt: int) -> float:
+        """Record the error, adjust concurrency, and return how long to wait before retrying."""
+        backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+        # Full jitter keeps retrying threads from stampeding back in lockstep.
+        delay = random.uniform(0, backoff)
+        retry_after = retry_after_of(exc)
+        if retry_after is not None:
+            delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        with self._cond:
+            if status_code_of(exc) == 429:
+                self.counters['throttles'] += 1
+                now = time.monotonic()
+                if now >= self._next_decrease_at:
+                    self.limit = max(self.min_concurrency, self.limit // 2)
+                    self._successes_at_limit = 0
+                    self._next_decrease_at = now + delay
+            else:
+                self.counters['server_errors'] += 1
+        return delay
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.counters, concurrency=self.limit, in_flight=self.in_flight)
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"{stats['requests']} requests, {stats['retries']} retries, {stats['throttles']} throttled, "
+            f"{stats['server_errors']} server/connection errors, {stats['failures']} failed; "
+            f"concurrency now {stats['concurrency']} (peak in flight {stats['peak_in_flight']})"
+        )
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+def prompt_version(template: str) -> str:
+    """Short stable id for a prompt template; editing the prompt invalidates cached results."""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:12]
+
+
+class ResultCache:
+    """
+    Persistent cache of parsed model responses, keyed on
+    (image SHA-256, model, prompt version, task). Thread-safe.
+
+    Holds at most max_entries rows; when a put goes over, the least recently used
+    rows are evicted. Hit and miss counts are kept for the end-of-run summary.
+    """
+
+    def __init__(self, path, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    image_sha TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (image_sha, model, prompt_version, task)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+
+    def get(self, image_sha: str, model: str, version: str, task: str = '') -> Optional[Dict]:
+        return self.get_any(image_sha, model, (version,), task)
+
+    def get_any(self, image_sha: str, model: str, versions, task: str = '') -> Optional[Dict]:
+        """The result cached under the first of versions that has one; counts one hit or miss."""
+        with self._lock, self._conn:
+            for version in versions:
+                key = (image_sha, model, version, task)
+                row = self._conn.execute(
+                    "SELECT analysis FROM results WHERE image_sha = ? AND model = ? AND prompt_version = ? AND task = ?",
+                    key,
+                ).fetchone()
+                if row is not None:
+                    break
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE results SET last_used = ? WHERE image_sha = ? AND model = ? AND prompt_version = ? AND task = ?",
+                (time.time(), *key),
+            )
+        return json.loads(row[0])
+
+    def contains(self, image_sha: str, model: str, versions, task: str = '') -> bool:
+        """Whether get_any would hit; a peek that touches neither the counts nor the LRU order."""
+        with self._lock:
+            return any(
+                self._conn.execute(
+                    "SELECT 1 FROM results WHERE image_sha = ? AND model = ? AND prompt_version = ? AND task = ?",
+                    (image_sha, model, version, task),
+                ).fetchone()
+                for version in versions
+            )
+
+    def put(self, image_sha: str, model: str, version: str, task: str, analysis: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (image_sha, model, prompt_version, task, analysis, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (image_sha, model, version, task, json.dumps(analysis), time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), {self.evictions} evicted"
@@ -1,91 +1,227 @@
-import base64
+import errno
 import json
 import os
 import shutil
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from openai import OpenAI
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Configuration
-OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-if not OPENROUTER_API_KEY:
-    print("Error: OPENROUTER_API_KEY not found in .env file")
-    exit()
-
-CLIENT = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY
-)
+
+import image_prep
+from api_client import create_client, missing_api_key
+from model_cascade import CONFIDENCE_INSTRUCTION, Cascade
+from pipeline import Pipeline
+from request_executor import RequestExecutor
+from sort_manifest import SortManifest, relative_key
+from telemetry import Telemetry
+
+# Configuration: OpenRouter by default, or LLM_BASE_URL (e.g. fake_llm_server.py).
+# CLIENT, TELEMETRY and MANIFEST are created by setup(), not at import: the pipeline's
+# prep processes re-import this script as __mp_main__ and must not open clients, files
+# or the manifest (whose compaction would race the parent's writes).
+CLIENT = None
 
 # Directories
 SOURCE_FOLDERS = ['New_Photos', 'Old_Photos']
 DIR_DAMAGED = 'Sorted_Images/Damaged'
 DIR_CLEAN = 'Sorted_Images/No_Damage'
 
-# Create output directories
-os.makedirs(DIR_DAMAGED, exist_ok=True)
-os.makedirs(DIR_CLEAN, exist_ok=True)
+# Concurrency starts at 5 requests in flight and adapts between 1 and MAX_WORKERS
+# depending on whether the provider is throttling.
+MAX_WORKERS = 16
+EXECUTOR = RequestExecutor(MAX_WORKERS, initial_concurrency=5)
+
+# Every photo goes to MODEL, or with SORT_CASCADE=1 a fast SCREEN_MODEL sees it first
+# and only damage, or a verdict below SORT_ESCALATE_CONFIDENCE, goes on to MODEL.
+MODEL = os.getenv('SORT_MODEL', 'google/gemini-3-pro-preview')
+CASCADE = Cascade(
+    os.getenv('SORT_SCREEN_MODEL', 'google/gemini-2.5-flash'),
+    MODEL,
+    min_confidence=float(os.getenv('SORT_ESCALATE_CONFIDENCE', '0.8')),
+    flag='has_damage'
+) if os.getenv('SORT_CASCADE', '').lower() in ('1', 'true', 'yes') else None
+
+DAMAGE_PROMPT = (
+    "You are a property inspector. Analyze this image for PROPERTY DAMAGE.\n"
+    "Look for: Stains on carpet/walls, holes, cracks, broken glass, water damage, mold, or broken fixtures.\n"
+    "Ignore: Clutter, messy beds, or old furniture styles. Only flag actual damage or filth.\n"
+    "Return a JSON object with this exact format:\n"
+    "{\"has_damage\": true, \"reason\": \"brief description of damage\"}\n"
+    "If no damage, set has_damage to false."
+)
+
+# Per-image stage timings, payload sizes and token usage as JSONL
+TELEMETRY_FILE = 'Sorted_Images/telemetry.jsonl'
+TELEMETRY = None
+
+# How a sorted photo lands in Damaged/No_Damage: 'copy', 'hardlink', 'reflink'
+# (copy-on-write clone), 'symlink', or 'manifest' (verdict recorded, no files touched).
+# hardlink and reflink fall back to a copy where the filesystem can't do them.
+OUTPUT_MODES = ('copy', 'hardlink', 'reflink', 'symlink', 'manifest')
+OUTPUT_MODE = os.getenv('SORT_OUTPUT_MODE', 'copy').lower()
+if OUTPUT_MODE not in OUTPUT_MODES:
+    raise ValueError(f"SORT_OUTPUT_MODE must be one of {', '.join(OUTPUT_MODES)}")
+FICLONE = 0x40049409  # Linux ioctl behind `cp --reflink`
+
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Seconds between progress lines while photos drain through the pipeline
+PROGRESS_INTERVAL = float(os.getenv('SORT_PROGRESS_INTERVAL', '10'))
+# The streaming scan only reaches the end of the tree near the end of the run, so there
+# is no ETA before then. SORT_COUNT_TOTAL=1 counts the photos in a second walk alongside
+# it for an early ETA, at the cost of listing every directory twice.
+COUNT_TOTAL = os.getenv('SORT_COUNT_TOTAL', '').lower() in ('1', 'true', 'yes')
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Verdict and reason for every photo already sorted, keyed on relative source path
+# plus content hash, so same-named photos in different folders don't collide.
+MANIFEST_FILE = 'Sorted_Images/manifest.jsonl'
+MANIFEST = None
+# Flat copies left in Damaged/No_Damage by runs from before the manifest, by filename;
+# listed once by setup() so unsorted photos don't each probe both folders.
+LEGACY_COPIES = None
 
-def analyze_image(file_path):
+def setup():
+    """Create the output directories and the client, telemetry log and manifest; idempotent."""
+    global CLIENT, TELEMETRY, MANIFEST, LEGACY_COPIES
+    if CLIENT is not None:
+        return
+    os.makedirs(DIR_DAMAGED, exist_ok=True)
+    os.makedirs(DIR_CLEAN, exist_ok=True)
+    CLIENT = create_client()
+    TELEMETRY = Telemetry(TELEMETRY_FILE, 'script')
+    MANIFEST = SortManifest(MANIFEST_FILE)
+    LEGACY_COPIES = legacy_copies()
+
+def already_sorted(file_path):
     filename = os.path.basename(file_path)
     
     # --- SKIP LOGIC ---
-    # Check if this file is already in Damaged or Clean folders
-    if os.path.exists(os.path.join(DIR_DAMAGED, filename)):
-        print(f"⏭️  Skipping {filename} (Already in Damaged)")
-        return None
-    if os.path.exists(os.path.join(DIR_CLEAN, filename)):
-        print(f"⏭️  Skipping {filename} (Already in Clean)")
-        return None
+    entry = MANIFEST.lookup(file_path)
+    if entry is None:
+        entry = adopt_legacy_copy(file_path)
+    if entry:
+        where = "Damaged" if entry['verdict'] == 'damaged' else "Clean"
+        print(f"⏭️  Skipping {filename} (Already in {where})")
+        return True
     # ------------------
+    return False
 
-    print(f"Analyzing: {filename}...")
+def legacy_copies():
+    """{filename: [(verdict, path), ...]} for photos sitting directly in Damaged/No_Damage."""
+    copies = {}
+    for verdict, directory in (('damaged', DIR_DAMAGED), ('clean', DIR_CLEAN)):
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(VALID_EXTENSIONS):
+                    copies.setdefault(entry.name, []).append((verdict, entry.path))
+    return copies
+
+def adopt_legacy_copy(file_path):
+    """
+    Photos sorted before the manifest existed were copied flat into Damaged/No_Damage
+    by filename. Adopt such a copy only if its content matches this photo exactly.
+    """
+    for verdict, legacy in LEGACY_COPIES.get(os.path.basename(file_path), ()):
+        if image_prep.source_sha256(legacy) == MANIFEST.content_hash(file_path):
+            return MANIFEST.record(file_path, verdict, None, legacy)
+    return None
 
+def destination_for(file_path, has_damage):
+    # Mirror the source layout so New_Photos/x.jpg and Old_Photos/x.jpg both fit.
+    return os.path.join(DIR_DAMAGED if has_damage else DIR_CLEAN, relative_key(file_path))
+
+def reflink(source, destination):
+    import fcntl
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, destination)
+
+def place_output(source, destination):
+    """Put the sorted photo at destination per OUTPUT_MODE; returns the mode actually used."""
+    if OUTPUT_MODE == 'manifest':
+        return OUTPUT_MODE
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # A re-sorted photo (its content changed) replaces the earlier output.
+    if os.path.lexists(destination):
+        os.remove(destination)
     try:
-        base64_image = encode_image(file_path)
-
-        response = CLIENT.chat.completions.create(
-            model="google/gemini-3-pro-preview",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": (
-                                "You are a property inspector. Analyze this image for PROPERTY DAMAGE.\n"
-                                "Look for: Stains on carpet/walls, holes, cracks, broken glass, water damage, mold, or broken fixtures.\n"
-                                "Ignore: Clutter, messy beds, or old furniture styles. Only flag actual damage or filth.\n"
-                                "Return a JSON object with this exact format:\n"
-                                "{\"has_damage\": true, \"reason\": \"brief description of damage\"}\n"
-                                "If no damage, set has_damage to false."
-                            )
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
+        if OUTPUT_MODE == 'hardlink':
+            os.link(source, destination)
+            return OUTPUT_MODE
+        if OUTPUT_MODE == 'reflink':
+            reflink(source, destination)
+            return OUTPUT_MODE
+        if OUTPUT_MODE == 'symlink':
+            os.symlink(os.path.abspath(source), destination)
+            return OUTPUT_MODE
+    except (OSError, ImportError) as e:
+        # EXDEV: different device; EPERM/EOPNOTSUPP/EINVAL/ENOTTY: not supported here
+        if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP,
+                                                      errno.EINVAL, errno.ENOTTY, errno.EMLINK):
+            raise
+        if os.path.lexists(destination):
+            os.remove(destination)
+    shutil.copy2(source, destination)
+    return 'copy'
+
+def classify(file_path, image_url, model, tier):
+    """One request to model for this photo; returns its parsed JSON verdict."""
+    prompt = DAMAGE_PROMPT + (CONFIDENCE_INSTRUCTION if tier == 'screen' else "")
+    request_started = time.perf_counter()
+    response = EXECUTOR.call(
+        CLIENT.chat.completions.create,
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text", 
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
                         }
-                    ]
-                }
-            ],
-            response_format={"type": "json_object"} 
-        )
+                    }
+                ]
+            }
+        ],
+        response_format={"type": "json_object"} 
+    )
 
+    parse_started = time.perf_counter()
+    try:
         result_text = response.choices[0].message.content
         if "```json" in result_text:
             result_text = result_text.replace("```json", "").replace("```", "")
             
-        result_json = json.loads(result_text)
+        return json.loads(result_text)
+    finally:
+        TELEMETRY.request(os.path.basename(os.path.dirname(file_path)), 1, response,
+                          parse_started - request_started, time.perf_counter() - parse_started,
+                          filename=os.path.basename(file_path), tier=tier, model=model,
+                          payload_bytes=len(image_url))
+
+def analyze_image(file_path, image_url=None):
+    filename = os.path.basename(file_path)
+
+    print(f"Analyzing: {filename}...")
+
+    try:
+        image_url = image_url or image_prep.image_data_url(file_path)
+
+        if CASCADE:
+            try:
+                result_json = classify(file_path, image_url, CASCADE.screen_model, 'screen')
+            except Exception as e:
+                print(f"⚠️  Screening failed for {filename}: {e}")
+                result_json = None
+            if CASCADE.should_escalate(result_json):
+                print(f"⬆️  Escalating {filename} to {MODEL}")
+                result_json = classify(file_path, image_url, MODEL, 'confirm')
+        else:
+            result_json = classify(file_path, image_url, MODEL, 'single')
         
         return {
             "file_path": file_path,
@@ -98,38 +234,122 @@ def analyze_image(file_path):
         print(f"❌ Error processing {filename}: {e}")
         return None
 
-def process_and_move(file_path):
-    result = analyze_image(file_path)
+def process_and_move(file_path, urls=None):
+    result = analyze_image(file_path, (urls or {}).get(file_path))
     
     if result:
+        destination = destination_for(result['file_path'], result['has_damage'])
         if result['has_damage']:
-            destination = os.path.join(DIR_DAMAGED, result['filename'])
             print(f"🔴 DAMAGE DETECTED: {result['filename']} ({result['reason']})")
         else:
-            destination = os.path.join(DIR_CLEAN, result['filename'])
             print(f"🟢 CLEAN: {result['filename']}")
         
-        shutil.copy2(result['file_path'], destination)
+        with TELEMETRY.timed('write', 'write', os.path.basename(os.path.dirname(file_path)),
+                             filename=result['filename']) as fields:
+            fields['output'] = place_output(result['file_path'], destination)
+            # An edited photo whose verdict flipped shouldn't stay in the other folder too.
+            # Manifest mode promises not to touch the output folders, so it leaves them be.
+            stale = destination_for(result['file_path'], not result['has_damage'])
+            if OUTPUT_MODE != 'manifest' and os.path.lexists(stale):
+                os.remove(stale)
+        MANIFEST.record(result['file_path'], 'damaged' if result['has_damage'] else 'clean',
+                        result['reason'], None if OUTPUT_MODE == 'manifest' else destination)
+
+def walk_images(folders, report_errors=True):
+    """
+    Yield image paths under folders as os.scandir finds them; only the directories
+    still to visit are held in memory.
+    """
+    stack = [folder for folder in reversed(folders) if os.path.exists(folder)]
+    while stack:
+        directory = stack.pop()
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.name.lower().endswith(VALID_EXTENSIONS) and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            if report_errors:
+                print(f"❌ Error scanning {directory}: {e}")
+        stack.extend(reversed(subdirectories))
+
+def scan_images(folders, counts):
+    """Image paths under folders, counted as found, so sorting starts on the first photo."""
+    for path in walk_images(folders):
+        counts['found'] += 1
+        yield path
+    counts['scanning'] = False
+
+def count_images(folders, counts):
+    """
+    Separate counting pass (run in a thread with SORT_COUNT_TOTAL) that sets
+    counts['total'], so progress can give an ETA long before the lazy scan reaches the
+    end of a big tree. Keeps no paths.
+    """
+    counts['total'] = sum(1 for _ in walk_images(folders, report_errors=False))
+
+def unsorted_images(paths, counts):
+    for path in paths:
+        if already_sorted(path):
+            counts['skipped'] += 1
+        else:
+            counts['queued'] += 1
+            yield path
+
+def print_progress(processed, counts, elapsed):
+    rate = processed / elapsed if elapsed else 0.0
+    line = f"📊 {processed} sorted, {counts['skipped']} skipped, {rate:.1f} photos/s"
+    total = counts['found'] if not counts['scanning'] else counts['total']
+    if total is None:
+        line += f" (still scanning, {counts['found']} photos found so far)"
+    elif rate:
+        # Photos the scan hasn't reached yet are assumed to be already sorted as often as
+        # the ones it has.
+        unscanned = max(0, total - counts['found'])
+        share = counts['queued'] / counts['found'] if counts['found'] else 1.0
+        remaining = counts['queued'] - processed + round(unscanned * share)
+        eta = remaining / rate
+        line += f", ~{remaining} to go, ETA " + (f"{eta:.0f}s" if eta < 120 else f"{eta / 60:.1f} min")
+    print(line)
 
 def main():
-    all_images = []
-    valid_extensions = ('.jpg', '.jpeg', '.png', '.webp')
-
-    print(f"Scanning folders...")
-    for folder in SOURCE_FOLDERS:
-        if os.path.exists(folder):
-            for root, dirs, files in os.walk(folder):
-                for file in files:
-                    if file.lower().endswith(valid_extensions):
-                        all_images.append(os.path.join(root, file))
-
-    print(f"Found {len(all_images)} total images. Checking which ones need processing...")
-    
-    # Process in Parallel
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(process_and_move, all_images)
+    if missing_api_key():
+        print("Error: OPENROUTER_API_KEY not found in .env file")
+        return
+    setup()
+
+    print(f"Scanning folders... (output mode: {OUTPUT_MODE}, {len(MANIFEST)} photos in manifest)")
+    counts = {'found': 0, 'skipped': 0, 'queued': 0, 'scanning': True, 'total': None}
+    if COUNT_TOTAL:
+        threading.Thread(target=count_images, args=(SOURCE_FOLDERS, counts), daemon=True).start()
+    to_process = unsorted_images(scan_images(SOURCE_FOLDERS, counts), counts)
+
+    # Process in Parallel: images are encoded in worker processes while earlier ones are analyzed.
+    # The pipeline pulls from the scan only as its bounded queue drains, so a huge tree
+    # is never listed (or submitted) up front.
+    pipeline = Pipeline(process_and_move, paths_of=lambda path: [path], io_workers=MAX_WORKERS, telemetry=TELEMETRY)
+    started = last_report = time.perf_counter()
+    processed = 0
+    for _ in pipeline.run(to_process):
+        processed += 1
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            print_progress(processed, counts, now - started)
+    print_progress(processed, counts, time.perf_counter() - started)
 
     print("\nProcessing Complete!")
+    print(f"API requests: {EXECUTOR.summary()}")
+    if CASCADE:
+        print(f"Cascade: {CASCADE.summary()}")
+    print(f"Pipeline: {pipeline.summary()}")
+    TELEMETRY.close()
+    print(f"Telemetry: {TELEMETRY.path}")
+    for line in TELEMETRY.summary_lines():
+        print(f"   {line}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
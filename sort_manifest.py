@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+import image_prep
+
+
+def relative_key(path) -> str:
+    """Source path relative to the working directory, with forward slashes."""
+    return os.path.relpath(path).replace(os.sep, '/')
+
+
+class SortManifest:
+    """
+    Verdicts for photos already sorted, as an append-only JSONL file with one entry
+    per (relative source path, content SHA-256). Loaded once into memory, so a skip
+    check is a dict lookup plus a stat; the content hash is only recomputed when a
+    file's size or mtime changed. Thread-safe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._keys = set()  # (relative path, sha256)
+        lines = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final line from an interrupted run
+                        continue
+                    lines += 1
+                    self._add(entry)
+        if lines > len(self._entries):
+            self.compact()
+
+    def _add(self, entry: Dict) -> None:
+        previous = self._entries.get(entry['path'])
+        if previous:
+            self._keys.discard((previous['path'], previous['sha256']))
+        self._entries[entry['path']] = entry
+        self._keys.add((entry['path'], entry['sha256']))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def content_hash(self, source) -> str:
+        """SHA-256 of the file, reusing the manifest's hash while size and mtime are unchanged."""
+        stat = os.stat(source)
+        entry = self._entries.get(relative_key(source))
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['sha256']
+        return image_prep.source_sha256(source)
+
+    def lookup(self, source) -> Optional[Dict]:
+        """The entry for this exact file content at this path, or None if it needs sorting."""
+        key = (relative_key(source), self.content_hash(source))
+        with self._lock:
+            return self._entries[key[0]] if key in self._keys else None
+
+    def record(self, source, verdict: str, reason: str, destination: Optional[str] = None) -> Dict:
+        """Append a verdict (durably: flushed and fsynced) and make it visible to lookups."""
+        stat = os.stat(source)
+        entry = {
+            'path': relative_key(source),
+            'sha256': self.content_hash(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'verdict': verdict,
+            'reason': reason,
+            'destination': destination,
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._add(entry)
+        return entry
+
+    def compact(self) -> None:
+        """Rewrite the file with only the latest entry per path, swapped in atomically."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
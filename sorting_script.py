@@ -1,23 +1,18 @@
-import base64
 import json
 import os
 import shutil
-import io
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from PIL import Image
-from openai import OpenAI
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+import image_prep
+from api_client import create_client, missing_api_key
+from pipeline import Pipeline
+from request_executor import RequestExecutor
+from telemetry import Telemetry, content_bytes
 
-# Configuration
-OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-CLIENT = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY
-)
+# Configuration: OpenRouter by default, or LLM_BASE_URL (e.g. fake_llm_server.py).
+# CLIENT and TELEMETRY are created by setup(), not at import, so the pipeline's prep
+# processes (which re-import this script as __mp_main__) open no clients or files.
+CLIENT = None
 
 # Directories
 DAMAGE_DIR = 'all_damages'
@@ -32,9 +27,24 @@ LOG_FILE = 'completed_log.txt'  # <--- NEW: Tracks successfully finished files
 
 # Settings
 BATCH_SIZE = 30      
-MAX_THREADS = 10     
+MAX_THREADS = 10     # starting number of batches in flight
+MAX_CONCURRENCY = 24 # ceiling the executor may climb to while the provider keeps up
 MAX_RES = 1024       
 
+EXECUTOR = RequestExecutor(MAX_CONCURRENCY, initial_concurrency=MAX_THREADS)
+
+# Per-batch stage timings, payload sizes and token usage as JSONL. Requests are
+# attributed to the damage item, which is this script's unit of cost.
+TELEMETRY = None
+
+def setup():
+    """Create the client and telemetry log; idempotent."""
+    global CLIENT, TELEMETRY
+    if CLIENT is not None:
+        return
+    CLIENT = create_client()
+    TELEMETRY = Telemetry(os.path.join(OUTPUT_BASE, 'telemetry.jsonl'), 'sorting_script')
+
 def load_completed_files():
     """Reads the log file to find out which images are already done."""
     if not os.path.exists(LOG_FILE):
@@ -48,27 +58,27 @@ def mark_as_completed(filename):
         f.write(f"{filename}\n")
 
 def resize_and_encode_image(image_path):
-    """Resizes image to save bandwidth and encodes to base64."""
+    """Resizes image to save bandwidth and returns it as a data: URL (cached on disk)."""
     try:
-        with Image.open(image_path) as img:
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            img.thumbnail((MAX_RES, MAX_RES))
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=85)
-            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return image_prep.image_data_url(image_path, max_res=MAX_RES)
     except Exception as e:
         print(f"Error encoding {image_path}: {e}")
         return None
 
-def find_visual_matches(reference_path, candidate_paths, damage_name, batch_num):
+def encoded_image(image_path, urls):
+    """Data URL prepared ahead by the pipeline, or encode it now if it wasn't."""
+    if urls and image_path in urls:
+        return urls[image_path]
+    return resize_and_encode_image(image_path)
+
+def find_visual_matches(reference_path, candidate_paths, damage_name, batch_num, urls=None):
     """
     Sends Reference + Batch of Candidates to Gemini.
     Returns: (matches_list, success_boolean)
     """
     # 1. Encode Reference
-    ref_b64 = resize_and_encode_image(reference_path)
-    if not ref_b64: return [], False
+    ref_url = encoded_image(reference_path, urls)
+    if not ref_url: return [], False
 
     messages_content = [
         {
@@ -93,18 +103,18 @@ def find_visual_matches(reference_path, candidate_paths, damage_name, batch_num)
         },
         {
             "type": "image_url",
-            "image_url": {"url": f"data:image/jpeg;base64,{ref_b64}"}
+            "image_url": {"url": ref_url}
         }
     ]
 
     # 2. Encode Candidates
     valid_candidates = []
     for path in candidate_paths:
-        b64 = resize_and_encode_image(path)
-        if b64:
+        url = encoded_image(path, urls)
+        if url:
             messages_content.append({
                 "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{b64}"}
+                "image_url": {"url": url}
             })
             valid_candidates.append(path)
 
@@ -115,24 +125,31 @@ def find_visual_matches(reference_path, candidate_paths, damage_name, batch_num)
     try:
         print(f"   🚀 [{damage_name}] Batch {batch_num}: Sending {len(valid_candidates)} images...")
         
-        start_time = time.time()
-        response = CLIENT.chat.completions.create(
+        start_time = time.perf_counter()
+        response = EXECUTOR.call(
+            CLIENT.chat.completions.create,
             model="google/gemini-3-pro-preview",
             messages=[{"role": "user", "content": messages_content}],
             response_format={"type": "json_object"},
             temperature=0.1
         )
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
 
         result_text = response.choices[0].message.content
         
         # DEBUG PRINT
         print(f"   📩 [{damage_name}] Batch {batch_num} Response ({duration:.1f}s): {result_text}")
 
-        if "```" in result_text:
-            result_text = result_text.replace("```json", "").replace("```", "")
-        
-        data = json.loads(result_text)
+        parse_started = time.perf_counter()
+        try:
+            if "```" in result_text:
+                result_text = result_text.replace("```json", "").replace("```", "")
+            
+            data = json.loads(result_text)
+        finally:
+            TELEMETRY.request(damage_name, len(valid_candidates) + 1, response, duration,
+                              time.perf_counter() - parse_started, batch=batch_num,
+                              payload_bytes=content_bytes(messages_content))
         match_indices = data.get("matches", [])
         
         final_matches = []
@@ -147,7 +164,8 @@ def find_visual_matches(reference_path, candidate_paths, damage_name, batch_num)
         print(f"   ⚠️ [{damage_name}] Batch {batch_num} API Error: {e}")
         return [], False # Failure
 
-def process_damage_item(damage_file):
+def plan_damage_item(damage_file):
+    """Phase 1 for one damage item; returns the Phase 2 batches as pipeline work units."""
     damage_path = os.path.join(DAMAGE_DIR, damage_file)
     damage_filename = os.path.basename(damage_file)
     damage_name_no_ext = os.path.splitext(damage_filename)[0]
@@ -180,37 +198,48 @@ def process_damage_item(damage_file):
 
     # --- PHASE 2: VISUAL MATCHING (Gemini) ---
     total_candidates = len(files_to_scan_visually)
-    all_batches_successful = True # Track if any batch fails
-    
+    units = []
     for i in range(0, total_candidates, BATCH_SIZE):
         batch_num = i // BATCH_SIZE + 1
         batch = files_to_scan_visually[i : i + BATCH_SIZE]
-        
-        matches, success = find_visual_matches(damage_path, batch, damage_filename, batch_num)
-        
-        if not success:
-            all_batches_successful = False
-            print(f"   🛑 [{damage_filename}] Batch {batch_num} FAILED. Will not mark file as complete.")
-        
-        if matches:
-            print(f"   ✅ [{damage_filename}] Batch {batch_num}: Found {len(matches)} matches")
-            for match_path in matches:
-                folder_name = os.path.basename(os.path.dirname(match_path))
-                file_name = os.path.basename(match_path)
-                new_name = f"{folder_name}_{file_name}"
+        units.append((damage_filename, damage_path, timeline_dir, batch_num, batch))
+    return units
+
+def process_batch(unit, urls=None):
+    """Phase 2 for one batch of candidates; returns whether the batch succeeded."""
+    damage_filename, damage_path, timeline_dir, batch_num, batch = unit
+    
+    matches, success = find_visual_matches(damage_path, batch, damage_filename, batch_num, urls)
+    
+    if not success:
+        print(f"   🛑 [{damage_filename}] Batch {batch_num} FAILED. Will not mark file as complete.")
+    
+    if matches:
+        print(f"   ✅ [{damage_filename}] Batch {batch_num}: Found {len(matches)} matches")
+        for match_path in matches:
+            folder_name = os.path.basename(os.path.dirname(match_path))
+            file_name = os.path.basename(match_path)
+            new_name = f"{folder_name}_{file_name}"
+            with TELEMETRY.timed('write', 'write', damage_filename, filename=new_name):
                 shutil.copy2(match_path, os.path.join(timeline_dir, new_name))
-        elif success:
-            print(f"   ❌ [{damage_filename}] Batch {batch_num}: No matches found.")
+    elif success:
+        print(f"   ❌ [{damage_filename}] Batch {batch_num}: No matches found.")
+    
+    return success
 
+def finish_damage_item(damage_filename, all_batches_successful):
     if all_batches_successful:
         print(f"🏁 FINISHED SUCCESS: {damage_filename}")
         mark_as_completed(damage_filename)
     else:
         print(f"⚠️ FINISHED WITH ERRORS: {damage_filename} (Will retry next run)")
-    
-    return damage_filename
 
 def main():
+    if missing_api_key():
+        print("Error: OPENROUTER_API_KEY not found in .env file")
+        return
+    setup()
+
     if not os.path.exists(DAMAGE_DIR):
         print(f"Error: {DAMAGE_DIR} directory not found.")
         return
@@ -224,20 +253,59 @@ def main():
     
     print(f"Found {len(all_damage_files)} total damage items.")
     print(f"Skipping {len(completed_files)} already completed.")
-    print(f"Processing {len(files_to_process)} items with {MAX_THREADS} threads.")
+    print(f"Processing {len(files_to_process)} items, starting at {MAX_THREADS} requests in flight (max {MAX_CONCURRENCY}).")
     print("------------------------------------------------")
-    
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = [executor.submit(process_damage_item, df) for df in files_to_process]
-        
-        for future in as_completed(futures):
+
+    # Batches left per item, and whether all of its batches so far succeeded
+    progress = {}
+
+    def all_units():
+        for damage_file in files_to_process:
             try:
-                result = future.result()
+                units = plan_damage_item(damage_file)
             except Exception as e:
-                print(f"Thread generated an exception: {e}")
+                print(f"Error preparing {damage_file}: {e}")
+                continue
+            if not units:
+                finish_damage_item(os.path.basename(damage_file), True)
+                continue
+            progress[units[0][0]] = {"remaining": len(units), "ok": True}
+            yield from units
+
+    def handle(unit, urls):
+        try:
+            success = process_batch(unit, urls)
+        except Exception as e:
+            print(f"   ⚠️ [{unit[0]}] Batch {unit[3]} exception: {e}")
+            success = False
+        return unit[0], success
+
+    # Images for upcoming batches are encoded in worker processes while earlier
+    # batches are with Gemini, so batches from different items overlap freely.
+    pipeline = Pipeline(
+        handle,
+        paths_of=lambda unit: [unit[1]] + unit[4],
+        io_workers=MAX_CONCURRENCY,
+        telemetry=TELEMETRY,
+        max_res=MAX_RES
+    )
+
+    # An item is finished once its last batch is in.
+    for damage_filename, success in pipeline.run(all_units()):
+        state = progress[damage_filename]
+        state["ok"] = state["ok"] and success
+        state["remaining"] -= 1
+        if state["remaining"] == 0:
+            finish_damage_item(damage_filename, state["ok"])
 
     print("\n------------------------------------------------")
     print(f"Done! Results are in '{OUTPUT_BASE}'")
+    print(f"API requests: {EXECUTOR.summary()}")
+    print(f"Pipeline: {pipeline.summary()}")
+    TELEMETRY.close()
+    print(f"Telemetry: {TELEMETRY.path}")
+    for line in TELEMETRY.summary_lines():
+        print(f"   {line}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Optional Prometheus textfile (node_exporter textfile collector format).
+PROMETHEUS_FILE = os.getenv('TELEMETRY_PROMETHEUS_FILE')
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def response_usage(response) -> Dict[str, int]:
+    usage = getattr(response, 'usage', None)
+    return {
+        'prompt_tokens': int(getattr(usage, 'prompt_tokens', 0) or 0),
+        'completion_tokens': int(getattr(usage, 'completion_tokens', 0) or 0),
+    }
+
+
+def content_bytes(content) -> int:
+    """Bytes of the image data URLs in a chat message's content list, i.e. what was uploaded."""
+    return sum(len(part['image_url']['url']) for part in content if part.get('type') == 'image_url')
+
+
+class Telemetry:
+    """
+    Structured per-image and per-request events for an analysis run, appended to a
+    JSONL file (one object per line, tagged with a run id) and aggregated in memory
+    for the end-of-run summary. Thread-safe.
+
+    Fields ending in `_s` are stage timings (read_s, decode_s, encode_s, request_s,
+    parse_s, write_s, and the pipeline's end-to-end latency_s per work unit). Token counts and uploaded bytes (`payload_bytes`) are summed per
+    inspection folder from request events only, and requests tagged with a model `tier`
+    are also totalled per tier.
+    """
+
+    def __init__(self, path, script: str, prometheus_path: Optional[str] = PROMETHEUS_FILE):
+        self.path = path
+        self.script = script
+        self.prometheus_path = prometheus_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+        self._folders: Dict[str, Dict[str, int]] = {}
+        self._tiers: Dict[str, Dict] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, kind: str, folder: str = '', **fields) -> None:
+        event = {'ts': round(time.time(), 3), 'run': self.run_id, 'script': self.script, 'kind': kind, 'folder': folder}
+        event.update(fields)
+        line = json.dumps(event)
+        with self._lock:
+            self._file.write(line + "\n")
+            for key, value in fields.items():
+                if key.endswith('_s') and isinstance(value, (int, float)):
+                    self._stages.setdefault(key[:-2], []).append(float(value))
+            totals = self._folders.setdefault(folder, {
+                'images': 0, 'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'payload_bytes': 0
+            })
+            if kind == 'request':
+                totals['requests'] += 1
+                totals['images'] += fields.get('images', 0)
+                for key in ('prompt_tokens', 'completion_tokens', 'payload_bytes'):
+                    totals[key] += fields.get(key, 0) or 0
+            if kind == 'request' and fields.get('tier'):
+                tier = self._tiers.setdefault(fields['tier'], {
+                    'model': fields.get('model', ''), 'requests': 0, 'images': 0,
+                    'prompt_tokens': 0, 'completion_tokens': 0, 'latencies': []
+                })
+                tier['requests'] += 1
+                tier['images'] += fields.get('images', 0)
+                tier['prompt_tokens'] += fields.get('prompt_tokens', 0) or 0
+                tier['completion_tokens'] += fields.get('completion_tokens', 0) or 0
+                tier['latencies'].append(float(fields.get('request_s', 0.0)))
+
+    def request(self, folder: str, images: int, response, request_s: float, parse_s: float, **fields) -> None:
+        """
+        Record one API call: its timings, image count and the token usage it reported.
+        Pass payload_bytes= for the image data it uploaded, and tier= and model= to have
+        it counted in the per-tier totals.
+        """
+        self.record('request', folder, images=images, request_s=round(request_s, 4), parse_s=round(parse_s, 4),
+                    **response_usage(response), **fields)
+
+    @contextmanager
+    def timed(self, kind: str, stage: str, folder: str = '', **fields):
+        """Record the block's duration as `<stage>_s`; the block may add to the yielded fields."""
+        started = time.perf_counter()
+        yield fields
+        fields[f'{stage}_s'] = round(time.perf_counter() - started, 4)
+        self.record(kind, folder, **fields)
+
+    def _tier_totals(self) -> Dict[str, Dict]:
+        return {tier: dict(totals, latencies=sorted(totals['latencies'])) for tier, totals in self._tiers.items()}
+
+    def summary_lines(self) -> List[str]:
+        with self._lock:
+            stages = {stage: sorted(values) for stage, values in self._stages.items()}
+            folders = {folder: dict(totals) for folder, totals in self._folders.items()}
+            tiers = self._tier_totals()
+        lines = []
+        for stage, values in stages.items():
+            lines.append(
+                f"{stage:<8} n={len(values):<6} p50={percentile(values, 50) * 1000:.1f}ms "
+                f"p95={percentile(values, 95) * 1000:.1f}ms max={values[-1] * 1000:.1f}ms"
+            )
+        for folder, totals in folders.items():
+            if not totals['requests']:
+                continue
+            tokens = totals['prompt_tokens'] + totals['completion_tokens']
+            per_image = tokens / totals['images'] if totals['images'] else 0.0
+            lines.append(
+                f"{folder or '(none)'}: {totals['requests']} requests, {totals['images']} images, "
+                f"{totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion tokens "
+                f"({per_image:.0f}/image)"
+            )
+        for tier, totals in tiers.items():
+            latencies = totals['latencies']
+            lines.append(
+                f"tier {tier} ({totals['model']}): {totals['requests']} requests, {totals['images']} images, "
+                f"p50={percentile(latencies, 50) * 1000:.0f}ms p95={percentile(latencies, 95) * 1000:.0f}ms, "
+                f"{totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion tokens"
+            )
+        return lines
+
+    def write_prometheus(self) -> None:
+        """Write the run's aggregates atomically, as the textfile collector requires."""
+        if not self.prometheus_path:
+            return
+        with self._lock:
+            stages = {stage: sorted(values) for stage, values in self._stages.items()}
+            folders = {folder: dict(totals) for folder, totals in self._folders.items()}
+            tiers = self._tier_totals()
+        script = self.script
+        lines = [
+            "# HELP inspection_stage_seconds Per-stage latency of the last analysis run.",
+            "# TYPE inspection_stage_seconds summary",
+        ]
+        for stage, values in stages.items():
+            labels = f'script="{script}",stage="{stage}"'
+            for quantile in (0.5, 0.95):
+                lines.append(f'inspection_stage_seconds{{{labels},quantile="{quantile}"}} {percentile(values, quantile * 100):.6f}')
+            lines.append(f"inspection_stage_seconds_sum{{{labels}}} {sum(values):.6f}")
+            lines.append(f"inspection_stage_seconds_count{{{labels}}} {len(values)}")
+        for name, key, help_text in (
+            ("inspection_images", "images", "Images sent to the model."),
+            ("inspection_requests", "requests", "API requests made."),
+            ("inspection_prompt_tokens", "prompt_tokens", "Prompt tokens billed."),
+            ("inspection_completion_tokens", "completion_tokens", "Completion tokens billed."),
+            ("inspection_payload_bytes", "payload_bytes", "Encoded image bytes uploaded."),
+        ):
+            lines.append(f"# HELP {name} {help_text} (last run, per folder)")
+            lines.append(f"# TYPE {name} gauge")
+            for folder, totals in folders.items():
+                label_folder = folder.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{script="{script}",folder="{label_folder}"}} {totals[key]}')
+        tier_metrics = (
+            ("inspection_tier_requests", "requests", "API requests made."),
+            ("inspection_tier_images", "images", "Images sent to the model."),
+            ("inspection_tier_prompt_tokens", "prompt_tokens", "Prompt tokens billed."),
+            ("inspection_tier_completion_tokens", "completion_tokens", "Completion tokens billed."),
+        )
+        for name, key, help_text in tier_metrics if tiers else ():
+            lines.append(f"# HELP {name} {help_text} (last run, per model tier)")
+            lines.append(f"# TYPE {name} gauge")
+            for tier, totals in tiers.items():
+                lines.append(f'{name}{{script="{script}",tier="{tier}",model="{totals["model"]}"}} {totals[key]}')
+        lines.append("# HELP inspection_last_run_timestamp_seconds When the last run finished.")
+        lines.append("# TYPE inspection_last_run_timestamp_seconds gauge")
+        lines.append(f'inspection_last_run_timestamp_seconds{{script="{script}"}} {time.time():.0f}')
+
+        tmp_path = self.prometheus_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            handle.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+    def flush(self) -> None:
+        """Push buffered events to disk and refresh the Prometheus file; for long-running use."""
+        with self._lock:
+            self._file.flush()
+        self.write_prometheus()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        self.write_prometheus()
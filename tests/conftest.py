@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR))
+
+import fake_llm_server  # noqa: E402
+
+
+@pytest.fixture
+def fake_llm():
+    """A FakeLLM served on a free local port, as (fake, base_url)."""
+    fake = fake_llm_server.FakeLLM(latency_ms=40, latency_dist='uniform', latency_spread=0.9,
+                                   positive_rate=0.4, seed=7)
+    server = fake_llm_server.serve(fake)
+    yield fake, f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
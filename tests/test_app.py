@@ -0,0 +1,83 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import pytest
+from PIL import Image
+
+import app as dashboard
+import thumbnails
+from record_store import JsonRecordStore
+
+
+def analysis_results(path, descriptions):
+    path.write_text(json.dumps([
+        {"folder": "Folder", "filename": f"{index}.jpg", "task_derived": f"Task {index}",
+         "analysis": {"has_issues": True, "description": description, "severity": "minor"}}
+        for index, description in enumerate(descriptions)
+    ]))
+    return path
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JsonRecordStore(tmp_path / "inspection_data.json", tmp_path / "backups")
+    monkeypatch.setattr(dashboard, "STORE", store)
+    return store
+
+
+def test_reingest_refreshes_descriptions_reviewers_left_alone(tmp_path, store):
+    dashboard.ingest_analysis_results(analysis_results(tmp_path / "a.json", ["crack", "dent"]))
+    client = dashboard.app.test_client()
+    response = client.post("/api/update", json={"id": "Folder/0.jpg", "description": "Hairline crack, cosmetic",
+                                                "status": "approved"})
+    assert response.status_code == 200
+    client.post("/api/update", json={"id": "Folder/1.jpg", "importance": "high"})
+
+    totals = dashboard.ingest_analysis_results(analysis_results(tmp_path / "b.json", ["crack!", "deep dent"]))
+
+    assert totals == {"added": 0, "updated": 1, "unchanged": 1}
+    edited, untouched = store.get("Folder/0.jpg"), store.get("Folder/1.jpg")
+    assert edited["description"] == "Hairline crack, cosmetic"
+    assert edited["status"] == "approved"
+    assert untouched["description"] == "deep dent"
+    assert untouched["importance"] == "high"
+
+
+@pytest.fixture
+def photos(tmp_path, monkeypatch):
+    monkeypatch.setattr(dashboard, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(dashboard, "THUMBS", thumbnails.ThumbnailCache(tmp_path / "thumb_cache", 1024 * 1024))
+    folder = tmp_path / "Folder"
+    folder.mkdir()
+    Image.new("RGB", (800, 600), (120, 90, 60)).save(folder / "whole.jpg", quality=90)
+    data = (folder / "whole.jpg").read_bytes()
+    (folder / "truncated.jpg").write_bytes(data[:len(data) // 3])
+    (folder / "garbage.jpg").write_bytes(b"not a jpeg at all")
+    return folder
+
+
+def test_thumbnail_is_downscaled(photos):
+    response = dashboard.app.test_client().get("/thumbs/320/Folder/whole.jpg", headers={"Accept": "image/webp"})
+    assert response.status_code == 200
+    assert response.mimetype == "image/webp"
+    assert Image.open(io.BytesIO(response.data)).width == 320
+
+
+@pytest.mark.parametrize("name", ["truncated.jpg", "garbage.jpg"])
+def test_undecodable_photo_serves_the_original(photos, name):
+    response = dashboard.app.test_client().get(f"/thumbs/320/Folder/{name}")
+    assert response.status_code == 200
+    assert response.data == (photos / name).read_bytes()
+
+
+def test_concurrent_exports_agree(tmp_path, store):
+    dashboard.ingest_analysis_results(analysis_results(tmp_path / "a.json", [f"crack {n}" for n in range(40)]))
+    store.update_many({f"Folder/{n}.jpg": {"status": "approved"} for n in range(40)})
+    client = dashboard.app.test_client()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        bodies = list(pool.map(lambda _: client.get("/export").get_data(as_text=True), range(32)))
+
+    assert len(set(bodies)) == 1
+    assert all(f"crack {n}" in bodies[0] for n in range(40))
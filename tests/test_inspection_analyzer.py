@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import benchmark
+import fake_llm_server
+from conftest import PACKAGE_DIR
+from rate_limiter import RateLimiter
+
+FOLDERS = ['8 Barnes Avenue Nov 3 Inspection', '8 Barnes Avenue Dec 1 Inspection']
+
+
+def make_inspection(tmp_path, per_folder):
+    images = benchmark.generate_images(tmp_path / "source", per_folder * len(FOLDERS), (320, 240),
+                                       duplicate_rate=0.0, seed=3)
+    expected = []
+    for number, folder in enumerate(FOLDERS):
+        (tmp_path / folder).mkdir()
+        for index, image in enumerate(images[number * per_folder:(number + 1) * per_folder]):
+            filename = f"- Item {index} {index}.jpg"
+            (tmp_path / folder / filename).write_bytes(image.read_bytes())
+            expected.append((folder, filename))
+    # The analyzer lists each folder sorted by filename.
+    return [(folder, filename) for folder in FOLDERS
+            for filename in sorted(name for f, name in expected if f == folder)]
+
+
+def run_analyzer(tmp_path, base_url, **env):
+    environment = dict(os.environ, LLM_BASE_URL=base_url, OPENROUTER_API_KEY='test',
+                       IMAGE_CACHE_DIR=str(tmp_path / ".image_cache"), ANALYZER_DEDUP_DISTANCE='-1')
+    environment.update({key: str(value) for key, value in env.items()})
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, str(PACKAGE_DIR / "inspection_analyzer.py")], cwd=tmp_path,
+                            env=environment, capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - started
+    assert result.returncode == 0, result.stdout + result.stderr
+    output_file = tmp_path / "Analysis_Results" / "analysis_results.json"
+    if not output_file.exists():  # Nothing was analyzed
+        return [], result.stdout, elapsed
+    with open(output_file, "r", encoding="utf-8") as handle:
+        return json.load(handle), result.stdout, elapsed
+
+
+def test_results_keep_folder_order_under_concurrency(tmp_path, fake_llm):
+    fake, base_url = fake_llm
+    expected = make_inspection(tmp_path, per_folder=10)
+
+    # One photo per request, eight in flight, jittered latency: replies finish out of order.
+    records, _, _ = run_analyzer(tmp_path, base_url, ANALYZER_MAX_IN_FLIGHT=8, ANALYZER_BATCH_SIZE=1,
+                                 ANALYZER_RPM=0)
+
+    assert [(record["folder"], record["filename"]) for record in records] == expected
+    assert fake.stats()["requests"] == len(expected)
+
+
+def test_folder_summary_matches_results(tmp_path, fake_llm):
+    _, base_url = fake_llm
+    make_inspection(tmp_path, per_folder=9)
+
+    records, stdout, _ = run_analyzer(tmp_path, base_url, ANALYZER_MAX_IN_FLIGHT=4, ANALYZER_BATCH_SIZE=4,
+                                      ANALYZER_RPM=0)
+
+    for folder in FOLDERS:
+        folder_records = [record for record in records if record["folder"] == folder]
+        issues = sum(1 for record in folder_records if record["analysis"].get("has_issues"))
+        match = re.search(rf"{re.escape(folder)}: (\d+) analyzed, (\d+) with issues", stdout)
+        assert match, stdout
+        assert (int(match.group(1)), int(match.group(2))) == (len(folder_records), issues)
+    total = re.search(r"Total images analyzed: (\d+)", stdout)
+    assert int(total.group(1)) == len(records) == 18
+
+
+def test_requests_per_minute_caps_the_request_rate(tmp_path, fake_llm):
+    fake, base_url = fake_llm
+    make_inspection(tmp_path, per_folder=6)
+
+    # 12 requests at 300/minute: the first goes at once, the other 11 are spaced 0.2s apart.
+    _, _, elapsed = run_analyzer(tmp_path, base_url, ANALYZER_MAX_IN_FLIGHT=8, ANALYZER_BATCH_SIZE=1,
+                                 ANALYZER_RPM=300)
+
+    assert fake.stats()["requests"] == 12
+    assert elapsed >= 11 * 0.2 * 0.95
+
+
+def test_rate_limiter_spaces_acquisitions():
+    limiter = RateLimiter(600)  # 10 per second
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+    assert 0.95 <= elapsed < 1.5
+
+
+def test_rate_limiter_zero_disables_limiting():
+    limiter = RateLimiter(0)
+    started = time.monotonic()
+    for _ in range(100):
+        assert limiter.acquire() == 0.0
+    assert time.monotonic() - started < 0.1
+
+
+def test_cache_counts_one_miss_per_photo(tmp_path, fake_llm):
+    _, base_url = fake_llm
+    make_inspection(tmp_path, per_folder=5)
+
+    _, stdout, _ = run_analyzer(tmp_path, base_url, ANALYZER_BATCH_SIZE=5, ANALYZER_RPM=0)
+    assert "Result cache:          0 hits, 10 misses" in stdout
+
+    _, stdout, _ = run_analyzer(tmp_path, base_url, ANALYZER_BATCH_SIZE=5, ANALYZER_RPM=0)
+    assert "Result cache:          10 hits, 0 misses" in stdout
+
+
+def test_failed_batch_request_is_not_resent_photo_by_photo(tmp_path):
+    fake = fake_llm_server.FakeLLM(latency_ms=1, throttle_rate=1.0, retry_after=0, seed=1)
+    server = fake_llm_server.serve(fake)
+    try:
+        make_inspection(tmp_path, per_folder=4)
+        records, _, _ = run_analyzer(tmp_path, f"http://127.0.0.1:{server.server_port}/v1",
+                                     ANALYZER_BATCH_SIZE=4, ANALYZER_RPM=0, ANALYZER_MAX_RETRIES=0)
+    finally:
+        server.shutdown()
+
+    assert records == []
+    assert fake.stats()["requests"] == 2  # one per folder's batch
+
+
+def test_compact_keeps_latest_record_per_photo(tmp_path):
+    import inspection_analyzer
+
+    log_file = tmp_path / "analysis_results.jsonl"
+    lines = [
+        {"folder": "A", "filename": "1.jpg", "analysis": {"has_issues": False}},
+        {"folder": "A", "filename": "2.jpg", "analysis": {"has_issues": False}},
+        {"folder": "B", "filename": "1.jpg", "analysis": {"has_issues": False}},
+        {"folder": "A", "filename": "1.jpg", "analysis": {"has_issues": True}},  # edited and re-analyzed
+    ]
+    log_file.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"folder": "A", "fil')
+
+    output_file = tmp_path / "analysis_results.json"
+    assert inspection_analyzer.compact_results(str(log_file), str(output_file)) == 3
+    records = json.loads(output_file.read_text())
+    assert [(record["folder"], record["filename"]) for record in records] == [("A", "1.jpg"), ("A", "2.jpg"), ("B", "1.jpg")]
+    assert records[0]["analysis"] == {"has_issues": True}
+    # The log is rewritten with one line per photo, so it doesn't grow with every run.
+    logged = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert logged == records
+
+
+def test_cached_photos_skip_preparation(tmp_path, fake_llm):
+    fake, base_url = fake_llm
+    make_inspection(tmp_path, per_folder=5)
+    run_analyzer(tmp_path, base_url, ANALYZER_BATCH_SIZE=5, ANALYZER_RPM=0)
+    fake.reset()
+
+    _, stdout, _ = run_analyzer(tmp_path, base_url, ANALYZER_BATCH_SIZE=5, ANALYZER_RPM=0)
+
+    with open(tmp_path / "Analysis_Results" / "telemetry.jsonl", "r", encoding="utf-8") as handle:
+        events = [json.loads(line) for line in handle]
+    last_run = [event for event in events if event["run"] == events[-1]["run"]]
+    assert "Result cache:          10 hits, 0 misses" in stdout
+    assert fake.stats()["requests"] == 0
+    assert not [event for event in last_run if event["kind"] == "image"]
+
+
+def test_batch_run_keeps_results_another_writer_logged(tmp_path, fake_llm):
+    _, base_url = fake_llm
+    make_inspection(tmp_path, per_folder=3)
+    # What watch.py appended for a photo that landed while the batch run was starting.
+    (tmp_path / "Analysis_Results").mkdir()
+    late = {"folder": FOLDERS[0], "filename": "- Late 1.jpg", "task_derived": "Late",
+            "analysis": {"has_issues": False, "description": "", "severity": "none"}}
+    (tmp_path / "Analysis_Results" / "analysis_results.jsonl").write_text(json.dumps(late) + "\n")
+
+    records, _, _ = run_analyzer(tmp_path, base_url, ANALYZER_BATCH_SIZE=3, ANALYZER_RPM=0)
+
+    assert late in records
+    assert len(records) == 7
+
+
+def test_near_duplicates_inherit_the_representative_result(tmp_path, fake_llm):
+    from test_phash_index import burst_shot, scene
+
+    fake, base_url = fake_llm
+    folder = tmp_path / FOLDERS[0]
+    folder.mkdir()
+    scene(folder / "- Kitchen sink 1.jpg", seed=1)
+    burst_shot(folder / "- Kitchen sink 1.jpg", folder / "- Kitchen sink 2.jpg")
+    scene(folder / "- Kitchen sink 3.jpg", seed=2)
+
+    records, stdout, _ = run_analyzer(tmp_path, base_url, ANALYZER_DEDUP_DISTANCE=6, ANALYZER_BATCH_SIZE=8,
+                                      ANALYZER_RPM=0)
+
+    by_name = {record["filename"]: record for record in records}
+    assert list(by_name) == ["- Kitchen sink 1.jpg", "- Kitchen sink 2.jpg", "- Kitchen sink 3.jpg"]
+    assert by_name["- Kitchen sink 2.jpg"]["inherited_from"] == "- Kitchen sink 1.jpg"
+    assert by_name["- Kitchen sink 2.jpg"]["analysis"] == by_name["- Kitchen sink 1.jpg"]["analysis"]
+    assert "inherited_from" not in by_name["- Kitchen sink 3.jpg"]
+    assert fake.stats()["images"] == 2
+    assert "Inherited (near-dups): 1" in stdout
+
+
+def test_cascade_escalates_only_unsure_screening_verdicts(monkeypatch):
+    import inspection_analyzer
+    from model_cascade import Cascade
+
+    screened = {
+        "sure_clean.jpg": {"has_issues": False, "confidence": 0.9},
+        "unsure_clean.jpg": {"has_issues": False, "confidence": 0.5},
+        "no_confidence.jpg": {"has_issues": False},
+        "issue.jpg": {"has_issues": True, "confidence": 0.95},
+        "unparseable.jpg": None,
+    }
+    tiers = {}
+
+    def analyze_batch(image_paths, data_urls=None, tier='single'):
+        tiers[tier] = list(image_paths)
+        if tier == 'screen':
+            return [analysis and {"filename": path, "analysis": analysis}
+                    for path, analysis in ((path, screened[path]) for path in image_paths)]
+        return [{"filename": path, "analysis": {"has_issues": True, "confirmed": True}} for path in image_paths]
+
+    cascade = Cascade('fast-model', inspection_analyzer.MODEL, min_confidence=0.8, flag='has_issues')
+    monkeypatch.setattr(inspection_analyzer, "CASCADE", cascade)
+    monkeypatch.setattr(inspection_analyzer, "analyze_batch", analyze_batch)
+
+    records = inspection_analyzer.analyze_photos(list(screened))
+
+    assert tiers['confirm'] == ["unsure_clean.jpg", "no_confidence.jpg", "issue.jpg", "unparseable.jpg"]
+    models = {record["filename"]: record["model"] for record in records}
+    assert models == {"sure_clean.jpg": "fast-model", "unsure_clean.jpg": inspection_analyzer.MODEL,
+                      "no_confidence.jpg": inspection_analyzer.MODEL, "issue.jpg": inspection_analyzer.MODEL,
+                      "unparseable.jpg": inspection_analyzer.MODEL}
+    assert cascade.counts == {'screened': 5, 'escalated': 4, 'positive': 1, 'low_confidence': 2, 'failed': 1}
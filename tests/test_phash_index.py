@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from phash_index import PerceptualHashIndex, dhash, hamming, phash
+
+THRESHOLD = 6  # ANALYZER_DEDUP_DISTANCE default
+
+
+def scene(path, seed):
+    """A smooth random scene, like a photo at hash resolution."""
+    coarse = np.random.default_rng(seed).integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    Image.fromarray(coarse).resize((640, 480), Image.BICUBIC).save(path, quality=92)
+    return path
+
+
+def burst_shot(source, path):
+    """The same scene a moment later: a little brighter, shifted a few pixels, re-encoded."""
+    with Image.open(source) as img:
+        img = ImageEnhance.Brightness(img).enhance(1.06).crop((4, 3, 636, 477)).resize((640, 480))
+        img.save(path, quality=75)
+    return path
+
+
+@pytest.fixture
+def photos(tmp_path):
+    base = scene(tmp_path / "base.jpg", seed=1)
+    return {
+        "base": base,
+        "burst": burst_shot(base, tmp_path / "burst.jpg"),
+        "other": scene(tmp_path / "other.jpg", seed=2),
+    }
+
+
+@pytest.mark.parametrize("hash_function", [phash, dhash])
+def test_near_duplicates_hash_within_threshold(photos, hash_function):
+    base, burst, other = (hash_function(photos[name]) for name in ("base", "burst", "other"))
+    assert hamming(base, np.array([burst], dtype=np.uint64))[0] <= THRESHOLD
+    assert hamming(base, np.array([other], dtype=np.uint64))[0] > THRESHOLD
+
+
+@pytest.mark.parametrize("algorithm", ["phash", "dhash"])
+def test_group_duplicates(tmp_path, photos, algorithm):
+    index = PerceptualHashIndex(str(tmp_path / "phash_index.db"), algorithm=algorithm)
+    paths = [str(photos[name]) for name in ("base", "other", "burst")]
+
+    assert index.group_duplicates(paths, THRESHOLD) == {paths[2]: paths[0]}
+    # Photos of different tasks are never grouped, however alike.
+    tasks = {paths[0]: "Sink", paths[1]: "Sink", paths[2]: "Oven"}
+    assert index.group_duplicates(paths, THRESHOLD, key=tasks.get) == {}
+    assert (index.computed, index.reused) == (3, 3)
+
+    reopened = PerceptualHashIndex(str(tmp_path / "phash_index.db"), algorithm=algorithm)
+    assert reopened.group_duplicates(paths, THRESHOLD) == {paths[2]: paths[0]}
+    assert reopened.computed == 0
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import benchmark
+from conftest import PACKAGE_DIR
+from pipeline import Pipeline
+from telemetry import Telemetry
+
+
+@pytest.mark.parametrize("module", ["script", "inspection_analyzer", "sorting_script"])
+def test_script_import_has_no_side_effects(tmp_path, module):
+    # Prep processes re-import the main script as __mp_main__; that must not create
+    # output directories, telemetry logs, caches or manifests in the working directory.
+    environment = dict(os.environ, PYTHONPATH=str(PACKAGE_DIR), OPENROUTER_API_KEY='test')
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=tmp_path, env=environment, check=True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unit_latency_covers_prep_and_handling(tmp_path):
+    photos = benchmark.generate_images(tmp_path / "Folder", 6, (400, 300), 0.0, seed=3)
+    telemetry = Telemetry(str(tmp_path / "telemetry.jsonl"), 'test', prometheus_path=None)
+
+    def handle(unit, urls):
+        time.sleep(0.05)
+        return sorted(path for path, url in urls.items() if url)
+
+    units = [[str(path) for path in photos[:3]], [str(path) for path in photos[3:]], []]
+    pipeline = Pipeline(handle, paths_of=lambda unit: unit, io_workers=2, prep_workers=1, telemetry=telemetry)
+    assert list(pipeline.run(units)) == [sorted(unit) for unit in units]
+    telemetry.close()
+
+    events = [json.loads(line) for line in open(telemetry.path, encoding='utf-8')]
+    latencies = [event for event in events if event['kind'] == 'unit']
+    # The unit with nothing to prepare sends no photos and has no latency to report.
+    assert [(event['folder'], event['images']) for event in latencies] == [("Folder", 3), ("Folder", 3)]
+    prep = {event['path']: event['read_s'] + event['decode_s'] + event['encode_s']
+            for event in events if event['kind'] == 'image'}
+    # Each unit waited for its own photos' prep before it was handled.
+    assert min(event['latency_s'] for event in latencies) >= 0.05 + min(
+        sum(prep[path] for path in unit) for unit in units[:2])
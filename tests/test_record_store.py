@@ -0,0 +1,143 @@
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from change_journal import ChangeJournal
+from record_store import JsonRecordStore, load_json, write_json
+
+
+def make_records(count=4):
+    return [{"id": f"Folder/{index}.jpg", "folder": "Folder", "status": "pending", "severity": "none"}
+            for index in range(count)]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data_file = tmp_path / "inspection_data.json"
+    write_json(data_file, make_records())
+    return data_file, tmp_path / "backups"
+
+
+def test_pending_journal_entries_replay_after_restart(paths):
+    data_file, backup_dir = paths
+    store = JsonRecordStore(data_file, backup_dir, snapshot_every=1000)
+    store.update_many({"Folder/1.jpg": {"status": "approved"}, "Folder/2.jpg": {"severity": "minor"}})
+
+    # Not compacted: the data file still has the old values, the journal has the edits.
+    on_disk = {record["id"]: record for record in load_json(data_file)}
+    assert on_disk["Folder/1.jpg"]["status"] == "pending"
+    assert store.journal.pending() == 2
+
+    restarted = JsonRecordStore(data_file, backup_dir, snapshot_every=1000)
+    assert restarted.get("Folder/1.jpg")["status"] == "approved"
+    assert restarted.get("Folder/2.jpg")["severity"] == "minor"
+    assert restarted.version() == store.version()
+
+
+def test_restore_between_snapshots_and_across_archives(paths):
+    data_file, backup_dir = paths
+    store = JsonRecordStore(data_file, backup_dir, snapshot_every=3)
+
+    def edit(item_id, status):
+        store.update_many({item_id: {"status": status}})
+        time.sleep(0.01)
+        return datetime.now()
+
+    store.all()  # first access takes the baseline snapshot
+    before_edits = datetime.now()
+    time.sleep(0.01)
+    after_first = edit("Folder/0.jpg", "approved")
+    edit("Folder/1.jpg", "approved")
+    edit("Folder/2.jpg", "approved")    # 3 pending entries: compaction, journal archived
+    after_fourth = edit("Folder/3.jpg", "rejected")
+    edit("Folder/0.jpg", "rejected")
+    edit("Folder/1.jpg", "rejected")    # second compaction and archive
+    after_seventh = edit("Folder/2.jpg", "rejected")
+
+    journal = ChangeJournal(backup_dir)
+    assert [seq for seq, _ in journal.archives()] == [3, 6]
+    assert len(journal.snapshots()) == 3
+
+    def statuses(at):
+        return [record["status"] for record in journal.restore(at)]
+
+    # Baseline snapshot plus the first entry, which now lives in the first archive.
+    assert statuses(after_first) == ["approved", "pending", "pending", "pending"]
+    # Second snapshot plus an entry from the second archive.
+    assert statuses(after_fourth) == ["approved", "approved", "approved", "rejected"]
+    # Newest snapshot plus the live journal.
+    assert statuses(after_seventh) == ["rejected", "rejected", "rejected", "rejected"]
+    assert statuses(after_seventh) == [record["status"] for record in store.all()]
+    with pytest.raises(ValueError):
+        journal.restore(datetime(2000, 1, 1))
+    assert statuses(before_edits) == ["pending"] * 4
+
+
+def test_two_stores_see_each_others_updates(paths):
+    data_file, backup_dir = paths
+    dashboard = JsonRecordStore(data_file, backup_dir, snapshot_every=1000)
+    ingest = JsonRecordStore(data_file, backup_dir, snapshot_every=1000)
+    start = dashboard.version()
+
+    dashboard.update_many({"Folder/0.jpg": {"status": "approved"}})
+    ingest.update_many({"Folder/1.jpg": {"severity": "severe"}})
+    dashboard.update_many({"Folder/2.jpg": {"status": "rejected"}})
+
+    assert ingest.get("Folder/0.jpg")["status"] == "approved"
+    assert ingest.get("Folder/2.jpg")["status"] == "rejected"
+    assert dashboard.get("Folder/1.jpg")["severity"] == "severe"
+    items, version, reset = dashboard.changes_since(start)
+    assert not reset
+    assert [item["id"] for item in items] == ["Folder/0.jpg", "Folder/1.jpg", "Folder/2.jpg"]
+    assert version == ingest.version() == start + 3
+
+    seqs = [entry["seq"] for entry in ChangeJournal(backup_dir).entries()]
+    assert len(seqs) == len(set(seqs))
+
+
+def test_outside_edit_of_the_data_file_resets_the_feed(paths):
+    data_file, backup_dir = paths
+    store = JsonRecordStore(data_file, backup_dir, snapshot_every=1000)
+    store.update_many({"Folder/0.jpg": {"status": "approved"}})
+    version = store.version()
+
+    edited = make_records(5)
+    edited[3]["severity"] = "moderate"
+    with data_file.open("w", encoding="utf-8") as handle:
+        json.dump(edited, handle)
+
+    assert store.get("Folder/3.jpg")["severity"] == "moderate"
+    assert len(store.all()) == 5
+    items, new_version, reset = store.changes_since(version)
+    assert reset and items == []
+    assert new_version > version
+    assert not store.changes_since(new_version)[2]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_upsert_keeps_review_fields(tmp_path, backend):
+    from record_store import SqliteRecordStore
+
+    if backend == "json":
+        store = JsonRecordStore(tmp_path / "inspection_data.json", tmp_path / "backups")
+    else:
+        store = SqliteRecordStore(tmp_path / "inspection_data.db")
+    store.upsert_many(make_records(3), {"status"})
+    store.flush()
+    store.update_many({"Folder/0.jpg": {"status": "approved"}, "Folder/1.jpg": {"status": "rejected"}})
+
+    fresh = make_records(4)
+    fresh[0]["severity"] = "severe"   # AI changed its mind; reviewer's status must survive
+    fresh[1]["severity"] = "none"     # only the kept field differs: unchanged
+    counts = store.upsert_many(fresh, {"status"})
+    store.flush()
+
+    assert counts == {"added": 1, "updated": 1, "unchanged": 2}
+    records = {record["id"]: record for record in store.all()}
+    assert records["Folder/0.jpg"]["status"] == "approved"
+    assert records["Folder/0.jpg"]["severity"] == "severe"
+    assert records["Folder/1.jpg"]["status"] == "rejected"
+    assert records["Folder/3.jpg"]["status"] == "pending"
+    assert list(records) == [f"Folder/{index}.jpg" for index in range(4)]
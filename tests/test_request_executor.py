@@ -0,0 +1,48 @@
+import email.utils
+import time
+from types import SimpleNamespace
+
+from request_executor import retry_after_of
+
+
+def error_with(headers):
+    return SimpleNamespace(response=SimpleNamespace(headers=headers))
+
+
+def test_retry_after_seconds_and_milliseconds():
+    assert retry_after_of(error_with({'retry-after': '3'})) == 3.0
+    assert retry_after_of(error_with({'retry-after-ms': '1500'})) == 1.5
+
+
+def test_retry_after_http_date():
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_of(error_with({'retry-after': later})) <= 31
+
+
+def test_unparseable_retry_after_is_ignored():
+    assert retry_after_of(error_with({'retry-after': 'soon'})) is None
+    assert retry_after_of(error_with({})) is None
+    assert retry_after_of(Exception()) is None
+
+
+def test_rate_limited_threads_do_not_hold_concurrency_slots():
+    import threading
+
+    from rate_limiter import RateLimiter
+    from request_executor import RequestExecutor
+
+    executor = RequestExecutor(4, rate_limiter=RateLimiter(60))  # one token a second
+    in_flight = []
+
+    def call():
+        in_flight.append(executor.stats()['in_flight'])
+
+    threads = [threading.Thread(target=executor.call, args=(call,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    # One request went through; the other two are waiting for tokens, not slots.
+    assert executor.stats()['in_flight'] == 0
+    assert in_flight == [1]
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,144 @@
+import errno
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import image_prep
+import script
+from model_cascade import Cascade
+from sort_manifest import SortManifest
+from telemetry import Telemetry
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("New_Photos")
+    with open("New_Photos/kitchen.jpg", "wb") as handle:
+        handle.write(b"photo" * 100)
+    return "New_Photos/kitchen.jpg"
+
+
+def destination(source):
+    return script.destination_for(source, True)
+
+
+def failing(code):
+    def fail(*args):
+        raise OSError(code, os.strerror(code))
+    return fail
+
+
+@pytest.mark.parametrize("code", [errno.EXDEV, errno.EPERM, errno.EMLINK])
+def test_hardlink_falls_back_to_copy(source, monkeypatch, code):
+    monkeypatch.setattr(script, "OUTPUT_MODE", "hardlink")
+    monkeypatch.setattr(os, "link", failing(code))
+
+    assert script.place_output(source, destination(source)) == "copy"
+    assert open(destination(source), "rb").read() == open(source, "rb").read()
+    assert os.stat(destination(source)).st_ino != os.stat(source).st_ino
+
+
+@pytest.mark.parametrize("code", [errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY])
+def test_reflink_falls_back_to_copy(source, monkeypatch, code):
+    def partial_clone(src, dst):
+        open(dst, "wb").close()  # the ioctl failed after the target was created
+        failing(code)()
+
+    monkeypatch.setattr(script, "OUTPUT_MODE", "reflink")
+    monkeypatch.setattr(script, "reflink", partial_clone)
+
+    assert script.place_output(source, destination(source)) == "copy"
+    assert open(destination(source), "rb").read() == open(source, "rb").read()
+
+
+def test_hardlink_when_supported(source, monkeypatch):
+    monkeypatch.setattr(script, "OUTPUT_MODE", "hardlink")
+    assert script.place_output(source, destination(source)) == "hardlink"
+    assert os.stat(destination(source)).st_ino == os.stat(source).st_ino
+
+
+def test_other_errors_are_not_masked(source, monkeypatch):
+    monkeypatch.setattr(script, "OUTPUT_MODE", "hardlink")
+    monkeypatch.setattr(os, "link", failing(errno.ENOSPC))
+    with pytest.raises(OSError):
+        script.place_output(source, destination(source))
+
+
+def test_manifest_mode_touches_no_files(source, monkeypatch):
+    monkeypatch.setattr(script, "OUTPUT_MODE", "manifest")
+    assert script.place_output(source, destination(source)) == "manifest"
+    assert not os.path.exists("Sorted_Images")
+
+
+class FakeExecutor:
+    """Replies per model, and records which models each photo was sent to."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.models = []
+
+    def call(self, create, model, **kwargs):
+        self.models.append(model)
+        message = SimpleNamespace(content=self.replies[model])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def cascade(tmp_path, monkeypatch):
+    cascade = Cascade('fast-model', script.MODEL, min_confidence=0.8, flag='has_damage')
+    monkeypatch.setattr(script, "CASCADE", cascade)
+    # The fake executor stands in for the call; classify only needs the method to pass on.
+    monkeypatch.setattr(script, "CLIENT", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None))))
+    monkeypatch.setattr(script, "TELEMETRY", Telemetry(str(tmp_path / "telemetry.jsonl"), 'script',
+                                                       prometheus_path=None))
+    return cascade
+
+
+@pytest.mark.parametrize("screen_reply, escalated", [
+    ('{"has_damage": false, "reason": "clean", "confidence": 0.95}', False),
+    ('{"has_damage": false, "reason": "clean", "confidence": 0.4}', True),
+    ('{"has_damage": false, "reason": "clean"}', True),
+    ('{"has_damage": false, "reason": "clean", "confidence": "sure"}', True),
+    ('{"has_damage": true, "reason": "crack", "confidence": 0.99}', True),
+    ('the photo looks clean to me', True),
+])
+def test_screening_verdicts_escalate_unless_confident(source, monkeypatch, cascade, screen_reply, escalated):
+    executor = FakeExecutor({'fast-model': screen_reply,
+                             script.MODEL: '{"has_damage": true, "reason": "second opinion"}'})
+    monkeypatch.setattr(script, "EXECUTOR", executor)
+
+    result = script.analyze_image(source, "data:image/jpeg;base64,AAAA")
+
+    assert executor.models == (['fast-model', script.MODEL] if escalated else ['fast-model'])
+    assert result["reason"] == ("second opinion" if escalated else "clean")
+    assert cascade.counts['escalated'] == int(escalated)
+
+
+def test_only_legacy_filenames_are_hashed(source, tmp_path, monkeypatch):
+    os.makedirs(script.DIR_DAMAGED)
+    os.makedirs(os.path.join(script.DIR_CLEAN, "New_Photos"))
+    with open(source, "rb") as handle:
+        photo = handle.read()
+    with open(os.path.join(script.DIR_DAMAGED, "kitchen.jpg"), "wb") as handle:
+        handle.write(photo)  # flat copy from a run before the manifest
+    with open(os.path.join(script.DIR_CLEAN, "bath.jpg"), "wb") as handle:
+        handle.write(b"a different photo")
+    for name in ("bath.jpg", "hall.jpg"):
+        with open(os.path.join("New_Photos", name), "wb") as handle:
+            handle.write(name.encode() * 100)
+    with open(os.path.join(script.DIR_CLEAN, "New_Photos", "hall.jpg"), "wb") as handle:
+        handle.write(b"already mirrored, not legacy")
+
+    monkeypatch.setattr(script, "MANIFEST", SortManifest(str(tmp_path / "manifest.jsonl")))
+    monkeypatch.setattr(script, "LEGACY_COPIES", script.legacy_copies())
+    hashed = []
+    sha256 = image_prep.source_sha256
+    monkeypatch.setattr(image_prep, "source_sha256", lambda path: hashed.append(path) or sha256(path))
+
+    assert script.adopt_legacy_copy(os.path.join("New_Photos", "hall.jpg")) is None
+    assert hashed == []
+    assert script.adopt_legacy_copy(os.path.join("New_Photos", "bath.jpg")) is None
+    assert script.adopt_legacy_copy(source)["verdict"] == "damaged"
+    assert script.MANIFEST.lookup(source)["destination"] == os.path.join(script.DIR_DAMAGED, "kitchen.jpg")
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from sort_manifest import SortManifest
+
+
+@pytest.fixture
+def photos(tmp_path, monkeypatch):
+    # Manifest keys are relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    for folder in ("New_Photos", "Old_Photos"):
+        os.makedirs(folder)
+        with open(os.path.join(folder, "kitchen.jpg"), "wb") as handle:
+            handle.write(folder.encode() * 100)
+    return os.path.join("New_Photos", "kitchen.jpg"), os.path.join("Old_Photos", "kitchen.jpg")
+
+
+def test_lookup_by_path_and_content(tmp_path, photos):
+    new, old = photos
+    manifest = SortManifest(str(tmp_path / "manifest.jsonl"))
+    assert manifest.lookup(new) is None
+
+    manifest.record(new, "damaged", "crack", "Sorted_Images/Damaged/New_Photos/kitchen.jpg")
+    assert manifest.lookup(new)["verdict"] == "damaged"
+    # Same filename in another folder is a different photo.
+    assert manifest.lookup(old) is None
+
+    reopened = SortManifest(str(tmp_path / "manifest.jsonl"))
+    assert reopened.lookup(os.path.abspath(new))["reason"] == "crack"
+    assert len(reopened) == 1
+
+    # An edited photo needs sorting again.
+    with open(new, "ab") as handle:
+        handle.write(b"edited")
+    assert reopened.lookup(new) is None
+
+
+def test_superseded_entries_are_compacted_on_load(tmp_path, photos):
+    new, old = photos
+    path = tmp_path / "manifest.jsonl"
+    manifest = SortManifest(str(path))
+    manifest.record(new, "clean", "", None)
+    manifest.record(old, "clean", "", None)
+    with open(new, "ab") as handle:
+        handle.write(b"edited")
+    manifest.record(new, "damaged", "new stain", None)
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write('{"path": "New_Ph')  # torn final line
+    assert len(path.read_text().splitlines()) == 4
+
+    reopened = SortManifest(str(path))
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(entry["path"], entry["verdict"]) for entry in entries] == [
+        ("New_Photos/kitchen.jpg", "damaged"), ("Old_Photos/kitchen.jpg", "clean")
+    ]
+    assert reopened.lookup(new)["verdict"] == "damaged"
+    assert reopened.lookup(old)["verdict"] == "clean"
@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+from telemetry import Telemetry, content_bytes
+
+
+def test_only_requests_count_as_uploaded_bytes(tmp_path):
+    prometheus = tmp_path / "inspection.prom"
+    telemetry = Telemetry(str(tmp_path / "telemetry.jsonl"), 'test', prometheus_path=str(prometheus))
+    # Prepared but never sent (cache hit, or its batch failed before the request).
+    telemetry.record('image', 'A', path='A/1.jpg', encode_s=0.01, encoded_bytes=5000)
+    content = [
+        {"type": "text", "text": "prompt"},
+        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + "x" * 977}},
+    ]
+    telemetry.request('A', 1, SimpleNamespace(usage=None), 0.2, 0.01, payload_bytes=content_bytes(content))
+    telemetry.close()
+
+    assert content_bytes(content) == 1000
+    assert 'inspection_payload_bytes{script="test",folder="A"} 1000' in prometheus.read_text()
@@ -0,0 +1,45 @@
+import hashlib
+from pathlib import Path
+
+import image_prep
+from disk_cache import DiskCache
+
+# Widths the routes accept, so a crawler can't fill the cache with arbitrary sizes.
+ALLOWED_SIZES = (320, 640, 1280)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# mime type, quality, extra save options. Progressive JPEGs render coarse-to-fine on slow links.
+FORMATS = {
+    "webp": ("image/webp", 80, {}),
+    "jpeg": ("image/jpeg", 82, {"progressive": True}),
+}
+# What Pillow raises for a truncated, corrupt or unrecognised image.
+DECODE_ERRORS = (OSError, SyntaxError, ValueError) + (
+    (image_prep.Image.DecompressionBombError,) if image_prep.Image is not None else ()
+)
+
+
+def available() -> bool:
+    # Pillow is optional for the dashboard; callers fall back to originals.
+    return image_prep.Image is not None
+
+
+class ThumbnailCache:
+    """
+    Downscaled copies of source photos, stored in a size-bounded DiskCache.
+
+    A variant's key hashes the source path, its mtime and size, the target width and
+    the format, so an edited photo simply gets a new entry.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache = DiskCache(cache_dir, max_bytes)
+
+    def get(self, source: Path, size: int, fmt: str) -> Path:
+        stat = source.stat()
+        key = hashlib.sha1(f"{source}|{stat.st_mtime_ns}|{stat.st_size}|{size}|{fmt}".encode("utf-8")).hexdigest()
+        cached = self.cache.lookup(key, fmt)
+        if cached is not None:
+            return cached
+        _, quality, options = FORMATS[fmt]
+        data = image_prep.encode(image_prep.open_oriented(source, size), fmt, quality, **options)
+        return self.cache.write(key, fmt, data)
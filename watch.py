@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from photo_watcher import IMAGE_EXTENSIONS, PhotoWatcher
+
+# A photo is analyzed once nothing has touched it for WATCH_DEBOUNCE seconds. Without
+# inotify, the folders are rescanned every WATCH_POLL_INTERVAL seconds.
+DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', '2'))
+POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '2'))
+# The analyzer's JSON array is rebuilt from the log at most every WATCH_COMPACT_INTERVAL
+# seconds while new results come in, and once more on shutdown; rebuilding it per batch
+# would rewrite the whole day's results each time.
+COMPACT_INTERVAL = float(os.getenv('WATCH_COMPACT_INTERVAL', '60'))
+
+
+class SortTarget:
+    """script.py: sorts each new or edited photo, recording it in the same manifest."""
+
+    recursive = True
+
+    def __init__(self, catch_up: bool):
+        import script
+        script.setup()
+        self.script = script
+        self.folders = script.SOURCE_FOLDERS
+        self.pool = ThreadPoolExecutor(max_workers=script.MAX_WORKERS)
+
+    def handle(self, paths):
+        to_process = [path for path in paths if not self.script.already_sorted(path)]
+        list(self.pool.map(self.script.process_and_move, to_process))
+        self.script.TELEMETRY.flush()
+        return len(to_process)
+
+    def tick(self, force=False):
+        """Nothing to do: each verdict is already fsynced to the manifest."""
+
+    def summary_lines(self):
+        lines = [f"API requests: {self.script.EXECUTOR.summary()}"]
+        if self.script.CASCADE:
+            lines.append(f"Cascade: {self.script.CASCADE.summary()}")
+        return lines
+
+    def close(self):
+        self.pool.shutdown()
+        self.script.TELEMETRY.close()
+
+
+class AnalyzerTarget:
+    """
+    inspection_analyzer.py: analyzes new or edited photos in batches, appends the records
+    to the results log and periodically re-compacts the JSON array app.py reads.
+    """
+
+    recursive = False
+
+    def __init__(self, catch_up: bool):
+        import inspection_analyzer as analyzer
+        analyzer.setup()
+        self.analyzer = analyzer
+        self.folders = analyzer.INSPECTION_FOLDERS
+        self.log_file = os.path.join(analyzer.OUTPUT_DIR, 'analysis_results.jsonl')
+        self.output_file = os.path.join(analyzer.OUTPUT_DIR, 'analysis_results.json')
+        self.dedup = analyzer.DEDUP_DISTANCE >= 0 and not analyzer.FORCE_ANALYSIS
+        self.pool = ThreadPoolExecutor(max_workers=analyzer.MAX_IN_FLIGHT)
+        self.last_compact = time.monotonic()
+        self.uncompacted = 0
+
+        # Latest record per photo from earlier runs, so near-duplicates can inherit them.
+        self.records = {}
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[os.path.join(record['folder'], record['filename'])] = record
+        # With catch_up, photos already in the log are skipped the first time they come up.
+        self.skip_once = set(self.records) if catch_up else set()
+
+    def task_of(self, path):
+        return self.analyzer.get_task_from_filename(os.path.basename(path))
+
+    def duplicate_of(self, path):
+        """Analyzed photo of the same task in the same folder that path nearly duplicates."""
+        folder, task = os.path.dirname(path), self.task_of(path)
+        candidates = sorted(
+            known for known, record in self.records.items()
+            if known != path and os.path.dirname(known) == folder and "inherited_from" not in record
+            and record["task_derived"] == task and os.path.exists(known)
+        )
+        if not candidates:
+            return None
+        duplicates = self.analyzer.HASH_INDEX.group_duplicates(
+            candidates + [path], self.analyzer.DEDUP_DISTANCE, key=self.task_of
+        )
+        return duplicates.get(path)
+
+    def handle(self, paths):
+        analyzer = self.analyzer
+        results = {}
+        by_folder = {}
+        for path in paths:
+            if path in self.skip_once:
+                self.skip_once.discard(path)
+                continue
+            source = self.duplicate_of(path) if self.dedup else None
+            if source:
+                results[path] = analyzer.inherit_record(path, self.records[source])
+                print(f"♻️  Near-duplicate of {os.path.basename(source)}: {os.path.basename(path)}")
+            else:
+                by_folder.setdefault(os.path.dirname(path), []).append(path)
+
+        batch_size = max(1, analyzer.BATCH_SIZE)
+        batches = [folder_paths[start:start + batch_size]
+                   for folder_paths in by_folder.values()
+                   for start in range(0, len(folder_paths), batch_size)]
+        for batch, records in zip(batches, self.pool.map(analyzer.analyze_photos, batches)):
+            results.update(zip(batch, records))
+
+        written = 0
+        for path in paths:
+            result = results.get(path)
+            if not result:
+                continue
+            with analyzer.TELEMETRY.timed('write', 'write', result['folder'], filename=result['filename']):
+                analyzer.save_result(result, self.log_file)
+            self.records[path] = result
+            written += 1
+        self.uncompacted += written
+        analyzer.TELEMETRY.flush()
+        return written
+
+    def tick(self, force=False):
+        """Re-compact the JSON array if results are waiting and the interval is up (or force)."""
+        if not self.uncompacted:
+            return
+        if not force and time.monotonic() - self.last_compact < COMPACT_INTERVAL:
+            return
+        count = self.analyzer.compact_results(self.log_file, self.output_file)
+        print(f"💾 {self.output_file} updated ({count} photos, {self.uncompacted} new)")
+        self.uncompacted = 0
+        self.last_compact = time.monotonic()
+
+    def summary_lines(self):
+        lines = [
+            f"Result cache: {self.analyzer.RESULT_CACHE.summary()}",
+            f"API requests: {self.analyzer.EXECUTOR.summary()}",
+        ]
+        if self.analyzer.CASCADE:
+            lines.append(f"Cascade: {self.analyzer.CASCADE.summary()}")
+        return lines
+
+    def close(self):
+        self.pool.shutdown()
+        self.tick(force=True)
+        self.analyzer.TELEMETRY.close()
+
+
+TARGETS = {
+    'script': SortTarget,
+    'analyzer': AnalyzerTarget,
+}
+
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch the photo folders and analyze each new or edited photo as soon as it has "
+                    "finished uploading, writing to the same results as the batch scripts."
+    )
+    parser.add_argument("target", choices=TARGETS, help="script = damage sorting, analyzer = inspection analysis")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE,
+                        help="Seconds a photo must stay unchanged before it is analyzed")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="Seconds between folder scans when inotify is unavailable")
+    parser.add_argument("--poll", action="store_true", help="Poll even where inotify is available")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="Also process photos already in the folders that aren't in the results yet")
+    args = parser.parse_args()
+
+    from api_client import missing_api_key
+    if missing_api_key():
+        print("Error: OPENROUTER_API_KEY not found in .env file")
+        return
+
+    target = TARGETS[args.target](args.catch_up)
+    watcher = PhotoWatcher(target.folders, recursive=target.recursive, debounce=args.debounce,
+                           poll_interval=args.poll_interval, use_inotify=False if args.poll else None,
+                           catch_up=args.catch_up)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"👀 Watching {', '.join(target.folders)} ({watcher.backend}, {args.debounce:g}s debounce, "
+          f"{', '.join(IMAGE_EXTENSIONS)})... Ctrl+C to stop")
+
+    processed = 0
+    try:
+        while True:
+            ready = watcher.poll(timeout=1.0)
+            target.tick()
+            if not ready:
+                continue
+            started = time.perf_counter()
+            print(f"\n📥 {len(ready)} photo(s) ready")
+            count = target.handle(ready)
+            processed += count
+            print(f"✅ {count} photo(s) done in {time.perf_counter() - started:.1f}s ({processed} this session)")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping watch mode")
+    finally:
+        watcher.close()
+        target.close()
+        for line in target.summary_lines():
+            print(f"   {line}")
+
+
+if __name__ == "__main__":
+    main()